@@ -1,57 +1,121 @@
 import streamlit as st
-import pandas as pd
-from detection.ensemble import detect_ensemble_outliers
-import io
+from detection.ensemble import ensemble_flags, build_ensemble_result
+from detection.loader import load_dataset
+from detection.export import EXPORT_FORMATS, MIME_TYPES, export_report
+from detection.profiling import StageProfiler
+from detection.snapshot import FLAG_COLUMNS, snapshot_flags, update_snapshot
+import hashlib
+
+#cache sizes bound memory: least recently used entries are evicted first
+CACHE_ENTRIES = 4
 
 st.set_page_config(page_title="Finance Outlier Detector", layout="wide")
 st.title("💼 Outlier Detection Dashboard")
 
-#CSV and excel input
-uploaded_file = st.file_uploader("📤 Upload your expense report (CSV or Excel)", type=["csv", "xlsx"])
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def parse_upload(digest, file_name, _data):
+    #keyed on the content hash; `_data` itself is not hashed by streamlit
+    #every column is kept for the report, but numerics are downcast and repeated strings become categories
+    return load_dataset(_data, file_name=file_name)
+
+
+@st.cache_resource(max_entries=CACHE_ENTRIES, show_spinner=False)
+def cached_flags(digest, id_col, threshold, k, contamination, _df):
+    return ensemble_flags(_df, id_column=id_col, threshold=threshold, k=k, contamination=contamination)
+
+
+def appended_flags(file_name, digest, id_col, params, data):
+    #one baseline snapshot per file and ID column; a re-upload of the grown file scores only the new rows
+    snapshots = st.session_state.setdefault("snapshots", {})
+    entry = snapshots.get((file_name, id_col))
+    if entry is None or entry["digest"] != digest:
+        snapshot, _ = update_snapshot(entry and entry["snapshot"], data, id_column=id_col, **params)
+        flags = snapshot_flags(snapshot)
+        #keep one frame of batches so the next update appends to it rather than concatenating them again
+        snapshot["flags"] = [flags]
+        entry = snapshots[(file_name, id_col)] = {
+            "digest": digest, "snapshot": snapshot, "flags": tuple(flags[col].to_numpy() for col in FLAG_COLUMNS)
+        }
+    return entry["flags"]
+
+
+#CSV, excel and columnar input
+uploaded_file = st.file_uploader(
+    "📤 Upload your expense report (CSV, Excel, Parquet or Arrow)", type=["csv", "xlsx", "parquet", "feather", "arrow"]
+)
 
 if uploaded_file:
-    if uploaded_file.name.endswith(".csv"):
-        df = pd.read_csv(uploaded_file)
-    else:
-        df = pd.read_excel(uploaded_file)
-
-    preview_rows = st.selectbox("🔍 Preview how many rows?", options=[5, 10, 20, 50, 100], index=0)
-    st.write("### 📄 Data Preview", df.head(preview_rows))
-
-    id_col = st.selectbox("🆔 Select unique ID column", options=df.columns, index=0)
-    voting = st.radio("🗳️ Voting Strategy", ["majority", "consensus"], horizontal=True)
-
-    if st.button("🚨 Detect Outliers"):
-        with st.spinner("Running ensemble detection..."):
-            result_df = detect_ensemble_outliers(df, id_column=id_col, voting=voting)
-
-            #define numeric columns before using them
-            numeric_cols = df.select_dtypes(include="number").columns.tolist()
-
-            num_outliers = result_df["is_outlier"].sum()
-            st.success(f"✅ Detected {num_outliers} outliers.")
-
-            st.write("### 🧾 Detection Results (Outliers Only)")
-            outliers = result_df[result_df["is_outlier"]]
-            numeric_cols = df.select_dtypes(include="number").columns.tolist()
-            raw_cols = [id_col, "zscore_flag", "iqr_flag", "iso_flag", "vote_count", "is_outlier"] + numeric_cols
-            display_cols = list(dict.fromkeys([col for col in raw_cols if col in outliers.columns]))
-            st.dataframe(outliers[display_cols])
-
-
-            output = io.BytesIO()
-            with pd.ExcelWriter(output, engine="xlsxwriter") as writer:
-                result_df.to_excel(writer, index=False, sheet_name="OutlierResults")
-                summary = pd.DataFrame({
-                    "Voting Strategy": [voting],
-                    "Total Rows": [len(result_df)],
-                    "Outliers Found": [num_outliers]
-                })
-                summary.to_excel(writer, sheet_name="Summary", index=False)
-
-            st.download_button(
-                label="📥 Download Outlier Report (Excel)",
-                data=output.getvalue(),
-                file_name="outlier_report.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-            )
+    #time every pipeline stage that runs in this rerun
+    with StageProfiler() as profiler:
+        data = uploaded_file.getvalue()
+        digest = hashlib.sha256(data).hexdigest()
+        df = parse_upload(digest, uploaded_file.name, data)
+
+        preview_rows = st.selectbox("🔍 Preview how many rows?", options=[5, 10, 20, 50, 100], index=0)
+        st.write("### 📄 Data Preview", df.head(preview_rows))
+
+        id_col = st.selectbox("🆔 Select unique ID column", options=df.columns, index=0)
+        voting = st.radio("🗳️ Voting Strategy", ["majority", "consensus"], horizontal=True)
+        params = {"threshold": 3.0, "k": 1.5, "contamination": 0.05}
+        incremental = uploaded_file.name.lower().endswith(".csv") and st.checkbox(
+            "♻️ Only score rows appended since this file was last uploaded", value=False
+        )
+
+        #remember that detection ran so widget changes re-vote instead of hiding results
+        detection_key = (digest, id_col)
+        if st.button("🚨 Detect Outliers"):
+            st.session_state["detection_key"] = detection_key
+
+        if st.session_state.get("detection_key") == detection_key:
+            with st.spinner("Running ensemble detection..."):
+                flags = appended_flags(uploaded_file.name, digest, id_col, params, data) if incremental else None
+                if flags is None or len(flags[0]) != len(df):
+                    flags = cached_flags(digest, id_col, params["threshold"], params["k"], params["contamination"], df)
+                #voting is only a view over the cached flags: nothing is cached on it and the report
+                #below is written from result_df when the download is clicked, never on a rerun
+                result_df = build_ensemble_result(df, *flags, voting=voting)
+
+                #define numeric columns before using them
+                numeric_cols = df.select_dtypes(include="number").columns.tolist()
+
+                num_outliers = result_df["is_outlier"].sum()
+                st.success(f"✅ Detected {num_outliers} outliers.")
+
+                st.write("### 🧾 Detection Results (Outliers Only)")
+                outliers = result_df[result_df["is_outlier"]]
+                raw_cols = [id_col, "zscore_flag", "iqr_flag", "iso_flag", "vote_count", "is_outlier"] + numeric_cols
+                display_cols = list(dict.fromkeys([col for col in raw_cols if col in outliers.columns]))
+                st.dataframe(outliers[display_cols])
+
+                export_format = st.selectbox("📄 Report format", options=EXPORT_FORMATS, index=0)
+                outliers_only = st.checkbox("Only include outliers in the report", value=False)
+
+                #the report is written to a temp file in chunks only when the button is clicked, on
+                #streamlit's download thread; its own profiler keeps the export timings for the panel
+                export_profiler = st.session_state.setdefault("export_profiler", StageProfiler())
+
+                def build_report():
+                    #streamlit serves bytes, not open temp files; the file is removed once read
+                    export_profiler.records.clear()
+                    with export_profiler, export_report(
+                        result_df, export_format, outliers_only=outliers_only, voting=voting
+                    ) as report:
+                        return report.read()
+
+                st.download_button(
+                    label=f"📥 Download Outlier Report ({export_format.upper()})",
+                    data=build_report,
+                    file_name=f"outlier_report.{export_format}",
+                    mime=MIME_TYPES[export_format]
+                )
+
+    with st.expander("⏱️ Stage timings"):
+        st.caption(
+            "Steps served from the cache are not re-run and do not appear here. "
+            "The export row is the latest finished report download."
+        )
+        export_profiler = st.session_state.get("export_profiler")
+        if export_profiler is not None:
+            profiler.records.extend(export_profiler.records)
+        st.dataframe(profiler.summary(), hide_index=True)
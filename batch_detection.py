@@ -0,0 +1,227 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+
+from detection.ensemble import build_vote_result
+from detection.loader import COLUMNAR_EXTENSIONS, detector_columns, load_dataset
+from detection.profiling import StageProfiler, log_stage, stage
+from detection.registry import DEFAULT_DETECTORS, DETECTORS, detector_inputs, run_detectors
+
+GROUND_TRUTH_PATH = "data/_ground_truth_log.json"
+
+
+def load_ground_truth(path=GROUND_TRUTH_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def guess_id_column(file_path, ground_truth):
+    file_name = os.path.basename(file_path)
+    if file_name in ground_truth:
+        return ground_truth[file_name]["id_column"]
+    columns = detector_columns(file_path, include_categorical=True)
+    id_like = [col for col in columns if col.lower().endswith("id")]
+    return id_like[0] if id_like else columns[0]
+
+
+def _prepare_inputs(file_path, id_column):
+    df = load_dataset(file_path, columns=detector_columns(file_path, id_column=id_column))
+    return df[id_column], detector_inputs(df, id_column=id_column)
+
+
+def _timed(profile, func, *args, **kwargs):
+    #returns (result, seconds, stage records); records only when profiling
+    started = time.perf_counter()
+    with StageProfiler() if profile else nullcontext() as profiler:
+        result = func(*args, **kwargs)
+    return result, time.perf_counter() - started, profiler.records if profile else []
+
+
+def run_dataset(
+    file_path, id_column, detectors=DEFAULT_DETECTORS, threshold=3.0, k=1.5, contamination=0.05, random_state=42,
+    profile=False, detector_workers=None
+):
+    """
+    Worker job: load one dataset and build the shared detector inputs (numeric
+    matrix and column statistics) once, then score them with every detector,
+    concurrently on `detector_workers` threads (default: one per detector, at
+    most one per CPU), so a single large dataset still uses several cores.
+
+    Returns:
+        tuple: (file_path, ids, flags, seconds, stages) where `flags` and
+        `seconds` map detector name -> boolean flags by row position and run
+        time (plus "prepare" for loading), and `stages` maps the same keys to
+        stage records when `profile` is set.
+    """
+    (ids, inputs), seconds, records = _timed(profile, _prepare_inputs, file_path, id_column)
+    seconds, stages, flags = {"prepare": round(seconds, 4)}, {"prepare": records}, {}
+    params = {"threshold": threshold, "k": k, "contamination": contamination, "random_state": random_state}
+    workers = min(detector_workers or os.cpu_count() or 1, len(detectors))
+    #each detector is timed on its own thread, where it gets its own profiler
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {name: pool.submit(_timed, profile, run_detectors, inputs, [name], **params) for name in detectors}
+        for name, future in futures.items():
+            result, detector_seconds, stages[name] = future.result()
+            flags[name] = result[name]
+            seconds[name] = round(detector_seconds, 4)
+    return file_path, ids, flags, seconds, stages
+
+
+def detection_metrics(flags, ids, true_ids):
+    metrics = {"flagged": int(flags.sum())}
+    if true_ids is not None:
+        predicted_ids = set(ids[flags].tolist())
+        tp = len(predicted_ids & true_ids)
+        metrics.update({
+            "true_positives": tp,
+            "injected": len(true_ids),
+            "precision": tp / len(predicted_ids) if predicted_ids else 0.0,
+            "recall": tp / len(true_ids) if true_ids else 0.0,
+        })
+    return metrics
+
+
+def dataset_keys(file_paths):
+    """
+    Map each path to its name relative to the directory the paths share, e.g.
+    "a.csv", "a.parquet" or "2024/a.csv", so no two datasets share an output.
+    """
+    root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in file_paths]) if file_paths else ""
+    return {path: os.path.relpath(os.path.abspath(path), root) for path in file_paths}
+
+
+def write_flags(result_df, output_dir, file_name, output_format):
+    #flags/<file name>.<format>, keeping the input extension: a.csv and a.parquet stay apart
+    path = os.path.join(output_dir, "flags", f"{file_name}.{output_format}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if output_format == "parquet":
+        result_df.to_parquet(path, index=False)
+    else:
+        result_df.to_csv(path, index=False)
+    return path
+
+
+def run_batch(
+    file_paths, output_dir="batch_output", workers=None, voting="majority", output_format="parquet",
+    threshold=3.0, k=1.5, contamination=0.05, ground_truth=None, profile=False, detectors=DEFAULT_DETECTORS,
+    detector_workers=None
+):
+    """
+    Score every dataset across a process pool, one job per dataset: each file
+    is parsed and its statistics computed once, then shared by every
+    registered detector in `detectors`, which run concurrently within the job
+    on `detector_workers` threads (default: the cores left over when there
+    are fewer datasets than workers). The ensemble is built from the
+    per-detector flags (no detector runs twice) and per-row flags plus a
+    metrics.json summary, keyed by each file's name relative to the
+    directory the inputs share, are written to `output_dir`.
+
+    With `profile`, every pipeline stage is logged as a JSON line on the
+    `detection.profiling` logger and per-stage seconds are added to the metrics.
+    """
+    ground_truth = ground_truth if ground_truth is not None else load_ground_truth()
+    id_columns = {path: guess_id_column(path, ground_truth) for path in file_paths}
+    keys = dataset_keys(file_paths)
+    params = {"threshold": threshold, "k": k, "contamination": contamination}
+    if detector_workers is None:
+        pool_size = workers or os.cpu_count() or 1
+        detector_workers = max(pool_size // max(min(len(file_paths), pool_size), 1), 1)
+
+    metrics = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        #biggest datasets first so one large file does not finish last
+        futures = [
+            pool.submit(
+                run_dataset, path, id_columns[path], detectors=detectors, profile=profile,
+                detector_workers=detector_workers, **params
+            )
+            for path in sorted(file_paths, key=os.path.getsize, reverse=True)
+        ]
+        for future in as_completed(futures):
+            path, ids, flags, seconds, stages = future.result()
+            file_name = keys[path]
+            id_column = id_columns[path]
+            stage_seconds = {}
+            for name, records in stages.items():
+                for record in records:
+                    log_stage(record, dataset=file_name, detector=name)
+                    totals = stage_seconds.setdefault(name, {})
+                    totals[record["stage"]] = round(totals.get(record["stage"], 0.0) + record["seconds"], 4)
+
+            profiler = StageProfiler(callback=lambda record: log_stage(record, dataset=file_name))
+            with profiler if profile else nullcontext():
+                result_df = build_vote_result(ids.to_frame(), flags, voting=voting)
+                with stage("export", "write_flags", rows=len(result_df)):
+                    flags_path = write_flags(result_df, output_dir, file_name, output_format)
+
+            #the ground-truth log is keyed by bare file name
+            truth = ground_truth.get(os.path.basename(path))
+            true_ids = set(truth["injected_ids"]) if truth else None
+            id_values = ids.to_numpy()
+            detector_flag_columns = {name: f"{name}_flag" for name in detectors}
+            detector_flag_columns["ensemble"] = "is_outlier"
+            metrics[file_name] = {
+                "rows": len(result_df),
+                "id_column": id_column,
+                "flags_path": flags_path,
+                "seconds": seconds,
+                "detectors": {
+                    name: detection_metrics(result_df[column].to_numpy(dtype=bool), id_values, true_ids)
+                    for name, column in detector_flag_columns.items()
+                },
+            }
+            if profile:
+                metrics[file_name]["stage_seconds"] = stage_seconds
+
+    #report datasets in the order they were given, not the order they finished
+    metrics = {keys[path]: metrics[keys[path]] for path in file_paths}
+    os.makedirs(output_dir, exist_ok=True)
+    with open(os.path.join(output_dir, "metrics.json"), "w") as f:
+        json.dump({"voting": voting, "params": params, "datasets": metrics}, f, indent=2)
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run every detector over a directory of CSV, Parquet or Arrow exports in parallel."
+    )
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--output-dir", default="batch_output")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--voting", choices=["majority", "consensus"], default="majority")
+    parser.add_argument("--format", choices=["parquet", "csv"], default="parquet")
+    parser.add_argument("--threshold", type=float, default=3.0)
+    parser.add_argument("--k", type=float, default=1.5)
+    parser.add_argument("--contamination", type=float, default=0.05)
+    parser.add_argument(
+        "--detectors", nargs="+", choices=list(DETECTORS), default=list(DEFAULT_DETECTORS),
+        help="Registered detectors to run and vote with"
+    )
+    parser.add_argument(
+        "--detector-workers", type=int, default=None,
+        help="Threads running one dataset's detectors (default: the cores left over by the process pool)"
+    )
+    parser.add_argument("--profile", action="store_true", help="Log per-stage timings as JSON lines")
+    args = parser.parse_args()
+    if args.profile:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    paths = sorted(
+        os.path.join(args.data_dir, file) for file in os.listdir(args.data_dir)
+        if file.endswith((".csv",) + COLUMNAR_EXTENSIONS)
+    )
+    results = run_batch(
+        paths, output_dir=args.output_dir, workers=args.workers, voting=args.voting,
+        output_format=args.format, threshold=args.threshold, k=args.k, contamination=args.contamination,
+        profile=args.profile, detectors=args.detectors, detector_workers=args.detector_workers,
+    )
+    for file_name, summary in results.items():
+        ensemble = summary["detectors"]["ensemble"]
+        print(f"📂 {file_name}: {ensemble['flagged']} / {summary['rows']} rows flagged by the ensemble")
+    print(f"📝 Metrics written to {os.path.join(args.output_dir, 'metrics.json')}")
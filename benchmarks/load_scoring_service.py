@@ -0,0 +1,93 @@
+import argparse
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+
+
+def _records(data_path, limit=10_000):
+    #round-trip through JSON so values are plain python types
+    return json.loads(pd.read_csv(data_path, nrows=limit).to_json(orient="records"))
+
+
+def _worker(host, port, records, offset, count, latencies, errors):
+    connection = http.client.HTTPConnection(host, port, timeout=60)
+    for i in range(count):
+        body = json.dumps(records[(offset + i) % len(records)]).encode()
+        started = time.perf_counter()
+        try:
+            connection.request("POST", "/score", body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as exc:
+            errors.append(type(exc).__name__)
+            connection.close()
+            connection = http.client.HTTPConnection(host, port, timeout=60)
+            continue
+        latencies.append(time.perf_counter() - started)
+    connection.close()
+
+
+def _health(host, port):
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    connection.request("GET", "/health")
+    health = json.loads(connection.getresponse().read())
+    connection.close()
+    return health
+
+
+def run_load(url, data_path, requests=5000, concurrency=32):
+    """
+    Send `requests` single-record scoring requests from `concurrency`
+    keep-alive clients and summarize throughput and latency percentiles.
+    """
+    parsed = urlparse(url)
+    host, port = parsed.hostname, parsed.port or 80
+    records = _records(data_path)
+    before = _health(host, port)
+
+    latencies, errors = [], []
+    per_worker = [requests // concurrency + (i < requests % concurrency) for i in range(concurrency)]
+    threads = [
+        threading.Thread(target=_worker, args=(host, port, records, i * 997, count, latencies, errors))
+        for i, count in enumerate(per_worker)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    seconds = time.perf_counter() - started
+
+    after = _health(host, port)
+    batches = after["batches"] - before["batches"]
+    latency_ms = np.asarray(latencies) * 1000
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "errors": len(errors),
+        "seconds": round(seconds, 3),
+        "requests_per_sec": round(len(latencies) / seconds, 1) if seconds > 0 else None,
+        "p50_ms": round(float(np.percentile(latency_ms, 50)), 2) if len(latency_ms) else None,
+        "p99_ms": round(float(np.percentile(latency_ms, 99)), 2) if len(latency_ms) else None,
+        "max_ms": round(float(latency_ms.max()), 2) if len(latency_ms) else None,
+        "mean_batch_size": round((after["records"] - before["records"]) / batches, 1) if batches else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the local scoring service with single-record requests.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--data", required=True, help="CSV whose rows are sent as records")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    print(json.dumps(run_load(args.url, args.data, requests=args.requests, concurrency=args.concurrency), indent=2))
@@ -0,0 +1,252 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, "data-generation"))
+
+from generate_large import build_frame
+
+from detection.rule_based import detect_z_score_outliers, detect_iqr_outliers
+from detection.ml_based import detect_robust_isolation_forest_outliers
+from detection.ensemble import detect_ensemble_outliers
+from detection.model import fit_detector_model, score_ensemble_outliers
+from detection.streaming import stream_detect_outliers
+from detection.online import RollingWindowDetector
+
+SIZES = {"10k": 10_000, "1m": 1_000_000, "10m": 10_000_000}
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+#per-event python loops are capped so a 10M-row run stays practical; rows/sec is still comparable
+ONLINE_MAX_EVENTS = 200_000
+
+#fit sample for the large-data Isolation Forest mode
+FOREST_SAMPLE_SIZE = 200_000
+
+#name -> (id column, time column, online value column, peer-group column)
+DATASETS = {
+    "employee_expense_reports": ("employee_id", "timestamp", "expense_amount", "department"),
+    "corporate_card_logs": ("card_id", "timestamp", "amount", "employee_id"),
+    "employee_productivity_logs": ("employee_id", None, "hours_logged", "department"),
+    "login_audit_logs": ("user_id", "login_time", "failed_attempts", "user_id"),
+    "emburse_expense_report": ("expense_id", "expense_date", "expense_amount", "employee_id"),
+}
+
+
+def make_dataset(name, n, seed=42):
+    """
+    Build `n` rows (0.1% injected outliers) with the vectorized generator and
+    render timestamps as strings, the way detectors see them after read_csv.
+    """
+    num_outliers = max(n // 1000, 1)
+    df, _, _ = build_frame(name, n - num_outliers, num_outliers=num_outliers, seed=seed)
+    for col in df.select_dtypes(include="datetime").columns:
+        df[col] = np.datetime_as_string(df[col].to_numpy(dtype="datetime64[s]"), unit="s")
+    return df
+
+
+def _proc_status_mb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _current_rss_mb():
+    return _proc_status_mb("VmRSS")
+
+
+def _reset_peak_rss():
+    #Linux only: writing 5 to clear_refs resets VmHWM to the current RSS
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _peak_rss_mb():
+    #VmHWM belongs to this process image; ru_maxrss survives fork+exec on Linux
+    peak = _proc_status_mb("VmHWM")
+    if peak is not None:
+        return peak
+    #ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _run_detector(detector, df, dataset, csv_path):
+    id_column, time_column, value_column, group_column = DATASETS[dataset]
+
+    if detector == "zscore":
+        detect_z_score_outliers(df, exclude_columns=[id_column])
+    elif detector == "iqr":
+        detect_iqr_outliers(df, exclude_columns=[id_column])
+    elif detector == "zscore_grouped":
+        detect_z_score_outliers(df, exclude_columns=[id_column], group_by=[group_column])
+    elif detector == "isolation_forest":
+        detect_robust_isolation_forest_outliers(df, exclude_columns=[id_column])
+    elif detector == "isolation_forest_sampled":
+        detect_robust_isolation_forest_outliers(df, exclude_columns=[id_column], sample_size=FOREST_SAMPLE_SIZE)
+    elif detector == "ensemble":
+        detect_ensemble_outliers(df, id_column=id_column)
+    elif detector == "model_score":
+        model = fit_detector_model(df, id_column=id_column)
+        started = time.perf_counter()
+        score_ensemble_outliers(model, df)
+        return len(df), time.perf_counter() - started
+    elif detector == "streaming":
+        stream_detect_outliers(csv_path, lambda chunk: None, exclude_columns=[id_column])
+    elif detector == "online":
+        if time_column is None:
+            return 0, 0.0
+        events = df.head(ONLINE_MAX_EVENTS)
+        online = RollingWindowDetector([value_column], time_column=time_column, key_column=id_column, window="7D")
+        records = events.to_dict("records")
+        started = time.perf_counter()
+        for record in records:
+            online.update(record)
+        return len(records), time.perf_counter() - started
+    else:
+        raise ValueError(f"Unknown detector {detector!r}")
+    return len(df), None
+
+
+DETECTORS = [
+    "zscore", "iqr", "zscore_grouped", "isolation_forest", "isolation_forest_sampled", "ensemble", "model_score",
+    "streaming", "online",
+]
+
+
+def _benchmark_child(queue, detector, dataset, parquet_path, csv_path):
+    df = pd.read_parquet(parquet_path)
+    _reset_peak_rss()
+    rss_before = _current_rss_mb() or _peak_rss_mb()
+    started = time.perf_counter()
+    rows, timed_seconds = _run_detector(detector, df, dataset, csv_path)
+    seconds = time.perf_counter() - started if timed_seconds is None else timed_seconds
+    peak = _peak_rss_mb()
+    queue.put({
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "rows_per_sec": round(rows / seconds, 1) if seconds > 0 else None,
+        "peak_rss_mb": round(peak, 1),
+        "peak_rss_delta_mb": round(peak - rss_before, 1),
+    })
+
+
+def run_one(detector, dataset, parquet_path, csv_path):
+    """
+    Run one detector in a fresh spawned process so peak RSS is not polluted by
+    earlier runs. Returns the measurement dict.
+    """
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_benchmark_child, args=(queue, detector, dataset, parquet_path, csv_path))
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        return {"error": f"exit code {process.exitcode}"}
+    return queue.get()
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_benchmarks(sizes, datasets, detectors, workdir, seed=42):
+    results = []
+    for size in sizes:
+        n = SIZES[size]
+        for dataset in datasets:
+            parquet_path = os.path.join(workdir, f"{dataset}_{size}.parquet")
+            csv_path = os.path.join(workdir, f"{dataset}_{size}.csv")
+            df = make_dataset(dataset, n, seed=seed)
+            df.to_parquet(parquet_path, index=False)
+            if "streaming" in detectors:
+                df.to_csv(csv_path, index=False)
+            del df
+
+            for detector in detectors:
+                measurement = run_one(detector, dataset, parquet_path, csv_path)
+                measurement.update({"size": size, "dataset": dataset, "detector": detector})
+                results.append(measurement)
+                print(json.dumps(measurement))
+    return results
+
+
+def compare_results(baseline_path, current_path, tolerance=0.2):
+    """
+    Print per-benchmark slowdowns between two results files and return the
+    entries whose wall time or peak RSS grew by more than `tolerance`.
+    """
+    with open(baseline_path) as f:
+        baseline = {(r["size"], r["dataset"], r["detector"]): r for r in json.load(f)["results"]}
+    with open(current_path) as f:
+        current = json.load(f)["results"]
+
+    regressions = []
+    for result in current:
+        key = (result["size"], result["dataset"], result["detector"])
+        before = baseline.get(key)
+        if before is None or "seconds" not in before or "seconds" not in result or not before["seconds"]:
+            continue
+        time_ratio = result["seconds"] / before["seconds"]
+        rss_ratio = result["peak_rss_delta_mb"] / max(before["peak_rss_delta_mb"], 1.0)
+        marker = "⚠️" if time_ratio > 1 + tolerance or rss_ratio > 1 + tolerance else "  "
+        print(f"{marker} {'/'.join(key)}: time x{time_ratio:.2f}, peak RSS delta x{rss_ratio:.2f}")
+        if marker != "  ":
+            regressions.append(key)
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time every detector on synthetic datasets of increasing size.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--datasets", nargs="+", choices=list(DATASETS), default=list(DATASETS))
+    parser.add_argument("--detectors", nargs="+", choices=DETECTORS, default=DETECTORS)
+    parser.add_argument("--output", default=None, help="Results JSON (default: benchmarks/results/<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CURRENT"),
+                        help="Compare two results files instead of running; exits 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare_results(*args.compare, tolerance=args.tolerance) else 0)
+
+    commit = _git_commit()
+    with tempfile.TemporaryDirectory() as workdir:
+        results = run_benchmarks(args.sizes, args.datasets, args.detectors, workdir)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump({
+            "commit": commit,
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "cpu_count": os.cpu_count(),
+            "results": results,
+        }, f, indent=2)
+    print(f"📝 Results written to {output}")
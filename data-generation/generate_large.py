@@ -0,0 +1,347 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+GROUND_TRUTH_PATH = "data/_ground_truth_log.json"
+
+YEAR_START = np.datetime64("2024-01-01T00:00:00", "s")
+YEAR_END = np.datetime64("2025-01-01T00:00:00", "s")
+
+
+def random_datetimes(rng, n, start=YEAR_START, end=YEAR_END):
+    #vectorized random_date(): uniform whole seconds in [start, end]
+    span = int((end - start) / np.timedelta64(1, "s"))
+    return start + rng.integers(0, span + 1, n).astype("timedelta64[s]")
+
+
+def _pick(pattern, options):
+    return np.asarray(options, dtype=object)[pattern]
+
+
+def _at(n, value):
+    return np.full(n, np.datetime64(value, "s"))
+
+
+def _employee_expense_reports(rng, n, first_id):
+    return pd.DataFrame({
+        "employee_id": rng.integers(1000, 1100, n),
+        "department": rng.choice(["Sales", "HR", "Engineering", "Finance"], n),
+        "expense_amount": rng.exponential(scale=300, size=n).round(2),
+        "category": rng.choice(["Travel", "Meals", "Software", "Supplies"], n),
+        "timestamp": random_datetimes(rng, n),
+    })
+
+
+def _employee_expense_outliers(rng, index, base_outlier_id):
+    pattern = index % 3
+    timestamps = np.where(
+        pattern == 0, _at(len(index), "2024-12-25T03:00:00"),
+        np.where(pattern == 1, _at(len(index), "2024-05-20T02:30:00"), random_datetimes(rng, len(index))),
+    )
+    df = pd.DataFrame({
+        "employee_id": base_outlier_id + index,
+        "department": _pick(pattern, ["Sales", "Finance", "HR"]),
+        "expense_amount": np.select([pattern == 0, pattern == 1], [17000 + index * 5, 0.99], 400),
+        "category": _pick(pattern, ["Meals", "Travel", "Crypto Consulting"]),
+        "timestamp": timestamps,
+    })
+    descriptions = _pick(pattern, [
+        "Massive expense disguised as meal in Sales",
+        "Suspiciously tiny expense",
+        "Rare category never seen in dataset",
+    ])
+    return df, descriptions
+
+
+def _corporate_card_logs(rng, n, first_id):
+    return pd.DataFrame({
+        "card_id": rng.integers(2000, 3000, n),
+        "employee_id": rng.integers(1000, 1100, n),
+        "merchant": rng.choice(["Amazon", "Uber", "Airbnb", "Office Depot", "Staples"], n),
+        "amount": np.abs(rng.normal(200, 100, n)).round(2),
+        "location": rng.choice(["NY", "CA", "TX", "FL", "WA"], n),
+        "timestamp": random_datetimes(rng, n),
+    })
+
+
+def _corporate_card_outliers(rng, index, base_outlier_id):
+    pattern = index % 2
+    ids = base_outlier_id + index
+    df = pd.DataFrame({
+        "card_id": ids,
+        "employee_id": ids,
+        "merchant": _pick(pattern, ["Uber", "DarkMarket"]),
+        "amount": np.where(pattern == 0, rng.uniform(5000, 15000, len(index)), 420.69),
+        "location": _pick(pattern, ["NY", "XX"]),
+        "timestamp": np.where(pattern == 0, _at(len(index), "2024-11-11T02:00:00"), _at(len(index), "2024-06-06T06:06:00")),
+    })
+    descriptions = _pick(pattern, [
+        "High amount ride service in middle of night",
+        "Merchant and location unknown to normal logs",
+    ])
+    return df, descriptions
+
+
+def _employee_productivity_logs(rng, n, first_id):
+    return pd.DataFrame({
+        "employee_id": rng.integers(1000, 1100, n),
+        "tasks_completed": rng.poisson(10, n),
+        "hours_logged": rng.normal(40, 5, n).round(1),
+        "department": rng.choice(["Sales", "HR", "Engineering", "Finance"], n),
+        "efficiency_score": rng.normal(75, 10, n).round(2),
+    })
+
+
+def _employee_productivity_outliers(rng, index, base_outlier_id):
+    pattern = index % 4
+    df = pd.DataFrame({
+        "employee_id": base_outlier_id + index,
+        "tasks_completed": np.array([0, 80, 5, 1])[pattern],
+        "hours_logged": np.array([90.0, 10.0, 5.0, 1.0])[pattern],
+        "department": _pick(pattern, ["Engineering", "Finance", "AI Division", "Sales"]),
+        "efficiency_score": np.array([5.0, 99.9, 99.9, -15.0])[pattern],
+    })
+    descriptions = _pick(pattern, [
+        "Worked 90 hrs with 0 tasks and terrible score",
+        "Extreme overperformance in short time",
+        "Unknown department with perfect score",
+        "Negative efficiency score",
+    ])
+    return df, descriptions
+
+
+def _login_audit_logs(rng, n, first_id):
+    octets = rng.integers(0, 256, (n, 2))
+    ip_address = "192.168." + pd.Series(octets[:, 0]).astype(str) + "." + pd.Series(octets[:, 1]).astype(str)
+    return pd.DataFrame({
+        "user_id": rng.integers(1000, 1100, n),
+        "ip_address": ip_address.to_numpy(),
+        "login_time": random_datetimes(rng, n),
+        "auth_method": rng.choice(["Password", "2FA", "SSO"], n),
+        "failed_attempts": rng.poisson(1, n),
+    })
+
+
+def _login_audit_outliers(rng, index, base_outlier_id):
+    pattern = index % 3
+    df = pd.DataFrame({
+        "user_id": base_outlier_id + index,
+        "ip_address": _pick(pattern, ["10.0.0.1", "0.0.0.0", "255.255.255.255"]),
+        "login_time": _at(len(index), "2024-10-13T02:50:00"),
+        "auth_method": "Password",
+        "failed_attempts": np.select([pattern == 0, pattern == 1], [35, 0], rng.integers(20, 41, len(index))),
+    })
+    descriptions = _pick(pattern, [
+        "Too many failed attempts from internal IP",
+        "Login from null IP",
+        "Broadcast IP with many failures",
+    ])
+    return df, descriptions
+
+
+def _emburse_expense_report(rng, n, first_id):
+    return pd.DataFrame({
+        "expense_id": np.arange(first_id, first_id + n),
+        "employee_id": rng.integers(1000, 1100, n),
+        "department": rng.choice(["Sales", "HR", "Engineering", "Finance"], n),
+        "expense_date": random_datetimes(rng, n).astype("datetime64[D]").astype("datetime64[s]"),
+        "merchant": rng.choice(["Delta Airlines", "Hilton", "Uber", "Amazon", "WeWork"], n),
+        "expense_amount": np.abs(rng.normal(250, 100, n)).round(2),
+        "currency": "USD",
+        "category": rng.choice(["Travel", "Lodging", "Meals", "Supplies", "Software"], n),
+        "payment_type": rng.choice(["Corporate Card", "Reimbursed"], n),
+        "project_code": rng.choice(["CLIENT001", "CLIENT002", "INTERNAL"], n),
+        "notes": rng.choice(["Client meeting", "Quarterly planning", "Office supplies", "Conference trip"], n),
+    })
+
+
+def _emburse_expense_outliers(rng, index, base_outlier_id):
+    pattern = index % 3
+    df = pd.DataFrame({
+        "expense_id": base_outlier_id + index,
+        "employee_id": np.array([9999, 9998, 9997])[pattern],
+        "department": _pick(pattern, ["Sales", "HR", "Finance"]),
+        "expense_date": np.array(["2024-12-30", "2024-02-15", "2024-06-01"], dtype="datetime64[s]")[pattern],
+        "merchant": _pick(pattern, ["Uber", "DarkWeb VPN", "Hilton"]),
+        "expense_amount": np.array([9000.00, 49.99, 0.01])[pattern],
+        "currency": "USD",
+        "category": _pick(pattern, ["Travel", "Software", "Lodging"]),
+        "payment_type": _pick(pattern, ["Corporate Card", "Reimbursed", "Corporate Card"]),
+        "project_code": _pick(pattern, ["CLIENT001", "INTERNAL", "CLIENT002"]),
+        "notes": _pick(pattern, ["Luxury ride to airport", "Unusual vendor", "Invalid minimal hotel stay"]),
+    })
+    descriptions = _pick(pattern, [
+        "Excessively high ride fare",
+        "Suspicious merchant for VPN service",
+        "Suspiciously small amount for lodging",
+    ])
+    return df, descriptions
+
+
+#same schemas and outlier patterns as generator.py / generate_emburse_expense_report.py
+SCHEMAS = {
+    "employee_expense_reports": (_employee_expense_reports, _employee_expense_outliers, "employee_id", 9999),
+    "corporate_card_logs": (_corporate_card_logs, _corporate_card_outliers, "employee_id", 8888),
+    "employee_productivity_logs": (
+        _employee_productivity_logs, _employee_productivity_outliers, "employee_id", 7777
+    ),
+    "login_audit_logs": (_login_audit_logs, _login_audit_outliers, "user_id", 6666),
+    "emburse_expense_report": (_emburse_expense_report, _emburse_expense_outliers, "expense_id", 99900),
+}
+
+
+def _first_normal_id(dataset, num_outliers):
+    #emburse expense ids start at 100000; shift them up if outlier ids would collide
+    base_outlier_id = SCHEMAS[dataset][3]
+    return max(100000, base_outlier_id + num_outliers)
+
+
+def build_frame(dataset, n, num_outliers=0, seed=42, row_offset=0, outlier_offset=0, total_outliers=None):
+    """
+    Build one in-memory DataFrame of `n` normal rows followed by `num_outliers`
+    injected rows, all drawn with vectorized numpy.
+
+    `row_offset`/`outlier_offset` place this frame inside a larger sharded
+    dataset so IDs and outlier patterns stay globally consistent.
+
+    Returns:
+        tuple: (df, injected_ids, descriptions)
+    """
+    normal, outliers, id_column, base_outlier_id = SCHEMAS[dataset]
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    first_id = _first_normal_id(dataset, num_outliers if total_outliers is None else total_outliers) + row_offset
+
+    df = normal(rng, n, first_id)
+    if num_outliers == 0:
+        return df, [], []
+    outliers_df, descriptions = outliers(rng, np.arange(outlier_offset, outlier_offset + num_outliers), base_outlier_id)
+    full_df = pd.concat([df, outliers_df], ignore_index=True)
+    return full_df, outliers_df[id_column].tolist(), descriptions.tolist()
+
+
+def parquet_schema(dataset):
+    """
+    Arrow schema of a dataset's shards, declared once from the column dtypes
+    of its normal rows so every chunk, outliers included, is written with the
+    same types whatever values it happens to hold.
+    """
+    import pyarrow as pa
+    normal = SCHEMAS[dataset][0]
+    return pa.Schema.from_pandas(normal(np.random.default_rng(0), 1, 0), preserve_index=False)
+
+
+def _write_chunk(df, path, output_format, writer, first):
+    if output_format == "csv":
+        df.to_csv(path, mode="w" if first else "a", header=first, index=False)
+        return
+    import pyarrow as pa
+    writer.write_table(pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False))
+
+
+def generate_shard(dataset, path, n, num_outliers, seed_sequence, row_offset, outlier_offset, total_outliers,
+                   output_format="csv", chunk_rows=1_000_000):
+    """
+    Write one shard in chunks of at most `chunk_rows` rows, normal rows first
+    and the shard's injected outliers last. Memory stays at about one chunk.
+    """
+    normal, outliers, id_column, base_outlier_id = SCHEMAS[dataset]
+    rng = np.random.default_rng(seed_sequence)
+    first_id = _first_normal_id(dataset, total_outliers) + row_offset
+
+    writer = None
+    if output_format == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(path, parquet_schema(dataset))
+    first = True
+    for start in range(0, n, chunk_rows):
+        size = min(chunk_rows, n - start)
+        _write_chunk(normal(rng, size, first_id + start), path, output_format, writer, first)
+        first = False
+
+    injected_ids, descriptions = [], []
+    for start in range(0, num_outliers, chunk_rows):
+        size = min(chunk_rows, num_outliers - start)
+        index = np.arange(outlier_offset + start, outlier_offset + start + size)
+        outliers_df, chunk_descriptions = outliers(rng, index, base_outlier_id)
+        _write_chunk(outliers_df, path, output_format, writer, first)
+        first = False
+        injected_ids.extend(outliers_df[id_column].tolist())
+        descriptions.extend(chunk_descriptions.tolist())
+
+    if writer is not None:
+        writer.close()
+    return os.path.basename(path), injected_ids, descriptions
+
+
+def generate_large_dataset(
+    dataset, n=1_000_000, num_outliers=1000, output_dir="data", shards=1, workers=None,
+    output_format="csv", chunk_rows=1_000_000, seed=42, ground_truth_path=GROUND_TRUTH_PATH
+):
+    """
+    Generate a dataset of `n` normal rows plus `num_outliers` injected rows,
+    split into `shards` files generated in parallel.
+
+    Each shard gets its own child of `np.random.SeedSequence(seed)`, so output
+    is reproducible regardless of worker count. Every shard file gets its own
+    entry in the ground-truth log with the outlier IDs it contains.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    id_column = SCHEMAS[dataset][2]
+    extension = "parquet" if output_format == "parquet" else "csv"
+    seeds = np.random.SeedSequence(seed).spawn(shards)
+    row_splits = np.array_split(np.arange(n), shards)
+    outlier_splits = np.array_split(np.arange(num_outliers), shards)
+
+    jobs = []
+    for shard, (rows, outlier_rows) in enumerate(zip(row_splits, outlier_splits)):
+        name = f"{dataset}.{extension}" if shards == 1 else f"{dataset}-{shard:05d}-of-{shards:05d}.{extension}"
+        jobs.append((
+            dataset, os.path.join(output_dir, name), len(rows), len(outlier_rows), seeds[shard],
+            int(rows[0]) if len(rows) else 0, int(outlier_rows[0]) if len(outlier_rows) else 0, num_outliers,
+            output_format, chunk_rows,
+        ))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(generate_shard, *zip(*jobs)))
+
+    ground_truth = {}
+    if ground_truth_path and os.path.exists(ground_truth_path):
+        with open(ground_truth_path) as f:
+            ground_truth = json.load(f)
+    for file_name, injected_ids, descriptions in results:
+        ground_truth[file_name] = {
+            "id_column": id_column,
+            "injected_ids": injected_ids,
+            "descriptions": descriptions,
+        }
+    if ground_truth_path:
+        with open(ground_truth_path, "w") as f:
+            json.dump(ground_truth, f, indent=2)
+    return [os.path.join(output_dir, file_name) for file_name, _, _ in results]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized, chunked, sharded synthetic data generator.")
+    parser.add_argument("--dataset", choices=list(SCHEMAS), required=True)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Normal rows (outliers are added on top)")
+    parser.add_argument("--outliers", type=int, default=1000)
+    parser.add_argument("--output-dir", default="data")
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH)
+    args = parser.parse_args()
+
+    paths = generate_large_dataset(
+        args.dataset, n=args.rows, num_outliers=args.outliers, output_dir=args.output_dir, shards=args.shards,
+        workers=args.workers, output_format=args.format, chunk_rows=args.chunk_rows, seed=args.seed,
+        ground_truth_path=args.ground_truth,
+    )
+    for path in paths:
+        print(f"📝 {path}")
@@ -0,0 +1,235 @@
+import numpy as np
+import pandas as pd
+
+from detection.profiling import stage
+from detection.schema import cached_schema, parse_datetime
+
+#entity keys tried in order when none is given
+ENTITY_COLUMNS = ("employee_id", "user_id", "card_id")
+
+#categorical fields whose distinct values per window are counted by default
+DISTINCT_COLUMNS = ("merchant", "ip_address", "location")
+
+ENTITY_WINDOWS = ("1h", "1D")
+
+
+def infer_entity_column(df, id_column=None):
+    """
+    The first of `ENTITY_COLUMNS` present in `df`, else `id_column` if it is
+    a column, else None.
+    """
+    for col in ENTITY_COLUMNS:
+        if col in df.columns:
+            return col
+    return id_column if id_column in df.columns else None
+
+
+def _epoch_seconds(values, fmt=None):
+    #whole epoch seconds as float, NaN for missing or unparseable timestamps
+    parsed = parse_datetime(pd.Series(values), fmt)
+    seconds = parsed.to_numpy(dtype="datetime64[s]").astype(np.int64).astype(np.float64)
+    seconds[parsed.isna().to_numpy()] = np.nan
+    return seconds
+
+
+def _window_starts(codes, seconds, window_seconds):
+    #rows are sorted by (entity, time); offsetting each entity by more than the
+    #time span plus the window turns all per-entity windows into one searchsorted
+    span = int(seconds.max() - seconds.min()) if len(seconds) else 0
+    position = codes * (span + window_seconds + 1) + (seconds - seconds.min()).astype(np.int64)
+    return np.searchsorted(position, position - window_seconds, side="right")
+
+
+def _window_sums(values, starts):
+    cumulative = np.concatenate([[0.0], np.cumsum(np.nan_to_num(values))])
+    return cumulative[1:] - cumulative[starts]
+
+
+def _window_max(values, starts):
+    #sparse table of maxima over power-of-two spans, one level per doubling of
+    #the longest window; every window is covered by two overlapping spans
+    n = len(values)
+    lengths = np.arange(n) - starts + 1
+    levels = [values]
+    while n and 2 ** len(levels) <= lengths.max():
+        half = 2 ** (len(levels) - 1)
+        previous = levels[-1]
+        levels.append(np.concatenate([np.fmax(previous[:-half], previous[half:]), previous[n - half:]]))
+    table = np.stack(levels)
+    level = np.floor(np.log2(lengths)).astype(np.int64)
+    return np.fmax(table[level, starts], table[level, np.arange(n) - 2 ** level + 1])
+
+
+def _window_distinct(codes, values, starts):
+    #row j counts toward window i when start_i <= j <= i and the previous row
+    #with the same (entity, value) lies before start_i; starts never decrease,
+    #so those rows i form one contiguous range per j, accumulated by difference
+    n = len(values)
+    value_codes, uniques = pd.factorize(values)
+    pairs = np.where(value_codes >= 0, codes * (len(uniques) + 1) + value_codes, -1)
+    order = np.argsort(pairs, kind="stable")
+    same = (pairs[order[1:]] == pairs[order[:-1]]) & (pairs[order[1:]] >= 0)
+    previous = np.full(n, -1)
+    previous[order[1:][same]] = order[:-1][same]
+
+    rows = np.arange(n)
+    low = np.maximum(rows, np.searchsorted(starts, previous, side="right"))
+    high = np.searchsorted(starts, rows, side="right")
+    valid = (low < high) & (pairs >= 0)
+    diff = np.bincount(low[valid], minlength=n + 1) - np.bincount(high[valid], minlength=n + 1)
+    return np.cumsum(diff)[:n].astype(np.float64)
+
+
+class EntityAggregator:
+    """
+    Trailing time-window aggregates per entity (employee, user, card), kept
+    up to date as rows are appended.
+
+    For every row and window (e.g. "1h") the aggregator counts the entity's
+    events in the window ending at that row, sums and maxes the value
+    columns and counts distinct values of the distinct columns, e.g.
+    `user_id_1h_count` or `employee_id_1D_merchant_distinct`. Rows are sorted
+    once by (entity, time) and every window is resolved with cumulative sums,
+    a sparse max table and a single searchsorted, so a batch costs
+    O(n log n) regardless of the number of entities.
+
+    Only each entity's rows within the longest window of its latest event
+    are kept between `update` calls, so appended batches are scored against
+    that retained tail without recomputing history. Rows with equal
+    timestamps count the rows that arrived before them. A late row, older
+    than its entity's retained tail, only sees the history still retained.
+
+    Parameters:
+        entity_column (str): Entity key. Defaults to the first of
+            `ENTITY_COLUMNS` in the data.
+        time_column (str): Timestamp column. Defaults to the first datetime
+            column of the inferred schema.
+        windows (list): Window lengths, e.g. ["10min", "1h", "1D"].
+        value_columns (list): Numeric columns to sum and max. Defaults to
+            the schema's numeric columns except the entity and ID columns.
+        distinct_columns (list): Columns whose distinct values are counted.
+            Defaults to those of `DISTINCT_COLUMNS` in the data.
+        id_column (str): ID column, never aggregated.
+    """
+
+    def __init__(
+        self, entity_column=None, time_column=None, windows=ENTITY_WINDOWS, value_columns=None,
+        distinct_columns=None, id_column=None
+    ):
+        self.entity_column = entity_column
+        self.time_column = time_column
+        self.windows = list(windows)
+        self.window_seconds = [int(pd.Timedelta(window).total_seconds()) for window in self.windows]
+        self.value_columns = value_columns
+        self.distinct_columns = distinct_columns
+        self.id_column = id_column
+        self.time_format = None
+        self._history = None
+
+    def _resolve_columns(self, df):
+        schema = cached_schema(df, self.id_column)
+        if self.entity_column is None:
+            self.entity_column = infer_entity_column(df, schema["id_column"])
+        if self.time_column is None:
+            self.time_column = next(iter(schema["datetime"]), None)
+        if self.entity_column is None or self.time_column is None:
+            raise ValueError(
+                f"Entity aggregation needs an entity column (one of {', '.join(ENTITY_COLUMNS)}) "
+                "and a timestamp column."
+            )
+        self.time_format = schema["datetime"].get(self.time_column)
+        if self.value_columns is None:
+            skip = {self.entity_column, schema["id_column"]}
+            self.value_columns = [col for col in schema["numeric"] if col not in skip]
+        if self.distinct_columns is None:
+            self.distinct_columns = [col for col in DISTINCT_COLUMNS if col in df.columns]
+
+    @property
+    def feature_columns(self):
+        columns = []
+        for window in self.windows:
+            prefix = f"{self.entity_column}_{window}"
+            columns.append(f"{prefix}_count")
+            for col in self.value_columns:
+                columns.extend([f"{prefix}_{col}_sum", f"{prefix}_{col}_max"])
+            columns.extend(f"{prefix}_{col}_distinct" for col in self.distinct_columns)
+        return columns
+
+    def _events(self, df):
+        events = pd.DataFrame({
+            "entity": df[self.entity_column].to_numpy(),
+            "seconds": _epoch_seconds(df[self.time_column].to_numpy(), self.time_format),
+        })
+        for col in self.value_columns:
+            events[col] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+        for col in self.distinct_columns:
+            events[col] = df[col].to_numpy()
+        return events
+
+    def update(self, df):
+        """
+        Aggregate the rows of `df`, appended after everything seen so far.
+
+        Returns:
+            pd.DataFrame: `feature_columns` aligned with `df.index`; NaN for
+            rows without an entity or a parseable timestamp.
+        """
+        if self.entity_column is None or self.time_column is None or self.value_columns is None:
+            self._resolve_columns(df)
+
+        with stage("preprocess", "entity_features", rows=len(df)):
+            events = self._events(df)
+            features = np.full((len(df), len(self.feature_columns)), np.nan)
+            usable = (events["entity"].notna() & events["seconds"].notna()).to_numpy()
+            history = self._history if self._history is not None else events.iloc[:0]
+            combined = pd.concat([history, events[usable]], ignore_index=True) if len(history) else events[usable]
+
+            codes, _ = pd.factorize(combined["entity"])
+            seconds = combined["seconds"].to_numpy()
+            #stable sort keeps arrival order among equal timestamps
+            order = np.lexsort((seconds, codes))
+            codes, seconds = codes[order], seconds[order]
+
+            computed = []
+            for window_seconds in self.window_seconds if len(order) else []:
+                starts = _window_starts(codes, seconds, window_seconds)
+                computed.append((np.arange(len(order)) - starts + 1).astype(np.float64))
+                for col in self.value_columns:
+                    values = combined[col].to_numpy()[order]
+                    computed.extend([_window_sums(values, starts), _window_max(values, starts)])
+                for col in self.distinct_columns:
+                    computed.append(_window_distinct(codes, combined[col].to_numpy()[order], starts))
+
+            #results back in arrival order; the retained history comes first
+            if computed:
+                restored = np.empty((len(order), len(computed)))
+                restored[order] = np.column_stack(computed)
+                features[usable] = restored[len(history):]
+
+            latest = combined.groupby("entity", sort=False)["seconds"].transform("max").to_numpy()
+            self._history = combined[combined["seconds"].to_numpy() > latest - max(self.window_seconds)]
+            self._history = self._history.reset_index(drop=True)
+
+        return pd.DataFrame(features, columns=self.feature_columns, index=df.index)
+
+
+def add_entity_features(
+    df, windows=ENTITY_WINDOWS, entity_column=None, time_column=None, id_column=None, aggregator=None
+):
+    """
+    Return a shallow copy of `df` with windowed entity aggregates (see
+    `EntityAggregator`) appended, so every detector can score them like any
+    other numeric column.
+
+    Pass a long-lived `aggregator` to score appended batches against the
+    history it retains: each call then advances its state by `df`, so every
+    batch must be passed exactly once, in arrival order. Without one, a new
+    aggregator sees `df` as the whole history.
+    """
+    if aggregator is None:
+        aggregator = EntityAggregator(entity_column, time_column, windows=windows, id_column=id_column)
+    features = aggregator.update(df)
+    result = df.copy(deep=False)
+    for col in features.columns:
+        result[col] = features[col].to_numpy()
+    return result
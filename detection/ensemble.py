@@ -1,34 +1,159 @@
-from detection.ml_based import detect_robust_isolation_forest_outliers
-from detection.rule_based import detect_z_score_outliers, detect_iqr_outliers
-import pandas as pd
-
-def detect_ensemble_outliers(df, id_column="id", voting="majority"):
-    z_df = detect_z_score_outliers(df, return_only_outliers=False, exclude_columns=[id_column])
-    iqr_df = detect_iqr_outliers(df, return_only_outliers=False, exclude_columns=[id_column])
-    iso_df = detect_robust_isolation_forest_outliers(
-        df, exclude_columns=[id_column], return_only_outliers=False, id_column=id_column
+from detection.aggregation import add_entity_features
+from detection.ml_based import DEFAULT_CATEGORICAL_ENCODING
+from detection.registry import DEFAULT_DETECTORS, detector_inputs, run_detectors
+from detection.profiling import profiled
+import numpy as np
+
+def detect_ensemble_outliers(
+    df, id_column="id", voting="majority", exclude_columns=None, return_only_outliers=False,
+    threshold=3.0, k=1.5, contamination=0.05, random_state=42, categorical_encoding=DEFAULT_CATEGORICAL_ENCODING,
+    forest_sample_size=None, n_jobs=None, time_features=False, detectors=DEFAULT_DETECTORS, weights=None,
+    min_votes=None, max_workers=None, entity_windows=None, entity_aggregator=None
+):
+    """
+    Fused ensemble of registered detectors (Z-score, IQR and Isolation Forest
+    by default; see `detection.registry`).
+
+    The numeric columns are projected once into a float64 matrix, statistics
+    for every column are computed in one pass, and the detectors score that
+    shared matrix concurrently. Votes are combined by row position, so
+    duplicate IDs never multiply rows.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        id_column (str): ID column, always excluded from scoring.
+        voting (str): "majority" (more than half the votes, 2 of 3) or
+            "consensus" (every vote).
+        exclude_columns (list): Extra columns to exclude from scoring.
+        return_only_outliers (bool): If True, return only the outlier rows.
+        threshold (float): Z-score threshold.
+        k (float): IQR multiplier.
+        contamination (float): Isolation Forest contamination.
+        random_state (int): Isolation Forest seed.
+        categorical_encoding (str): "frequency" (default), "onehot", "hash"
+            or None; feeds categorical columns to the Isolation Forest.
+        forest_sample_size (int): Fit the Isolation Forest on a sample of at
+            most this many rows and score all rows in parallel chunks.
+        n_jobs (int): Threads for the chunked forest scoring.
+        time_features (bool): Score hour-of-day and day-of-week features of
+            every date column with all detectors.
+        detectors (list): Registered detector names to run, e.g.
+            ["zscore", "iqr", "iso", "mad", "lof"].
+        weights (dict): Optional detector name -> vote weight (default 1).
+        min_votes (float): k-of-n voting: flag rows whose (weighted) votes
+            reach this value. Overrides `voting`.
+        max_workers (int): Threads running detectors concurrently.
+        entity_windows (list): Window lengths, e.g. ["1h", "1D"]; adds the
+            per-entity aggregates of `detection.aggregation` over `df` as
+            scored columns.
+        entity_aggregator (EntityAggregator): Long-lived aggregator to use
+            instead, so a batch appended to earlier data only updates the
+            aggregates rather than recomputing history. Advanced by `df`.
+
+    Returns:
+        pd.DataFrame: Input rows with a `<name>_flag` column per detector,
+        `vote_count` and `is_outlier` (and the entity aggregates, if any).
+    """
+    if entity_aggregator is not None or entity_windows:
+        df = add_entity_features(df, windows=entity_windows, id_column=id_column, aggregator=entity_aggregator)
+    inputs = detector_inputs(
+        df, id_column=id_column, exclude_columns=exclude_columns, categorical_encoding=categorical_encoding,
+        time_features=time_features,
+    )
+    flags = run_detectors(
+        inputs, detectors, max_workers=max_workers, threshold=threshold, k=k, contamination=contamination,
+        random_state=random_state, forest_sample_size=forest_sample_size, n_jobs=n_jobs,
+    )
+    return build_vote_result(
+        df, flags, voting=voting, weights=weights, min_votes=min_votes, return_only_outliers=return_only_outliers
+    )
+
+
+def ensemble_flags(
+    df, id_column="id", exclude_columns=None, threshold=3.0, k=1.5, contamination=0.05, random_state=42,
+    categorical_encoding=DEFAULT_CATEGORICAL_ENCODING, forest_sample_size=None, n_jobs=None, time_features=False
+):
+    """
+    Score the shared numeric matrix with the Z-score, IQR and Isolation
+    Forest detectors.
+
+    Returns:
+        tuple: (zscore_flag, iqr_flag, iso_flag) boolean arrays by row position.
+        Pass them to `build_ensemble_result` to vote without rescoring.
+    """
+    inputs = detector_inputs(
+        df, id_column=id_column, exclude_columns=exclude_columns, categorical_encoding=categorical_encoding,
+        time_features=time_features,
+    )
+    flags = run_detectors(
+        inputs, DEFAULT_DETECTORS, threshold=threshold, k=k, contamination=contamination,
+        random_state=random_state, forest_sample_size=forest_sample_size, n_jobs=n_jobs,
     )
+    return flags["zscore"], flags["iqr"], flags["iso"]
 
-    #makes sure id columns are strings
-    df_result = df.copy()
-    df_result[id_column] = df_result[id_column].astype(str)
-    z_df[id_column] = z_df[id_column].astype(str)
-    iqr_df[id_column] = iqr_df[id_column].astype(str)
-    iso_df[id_column] = iso_df[id_column].astype(str)
 
-    df_result["zscore_flag"] = df_result[id_column].isin(z_df[z_df["is_outlier"]][id_column])
-    df_result["iqr_flag"] = df_result[id_column].isin(iqr_df[iqr_df["is_outlier"]][id_column])
-    iso_flag_df = iso_df[[id_column, "is_outlier"]].rename(columns={"is_outlier": "iso_flag"})
+def vote(flags, voting="majority", weights=None, min_votes=None):
+    """
+    Combine detector flags into a per-row vote.
 
-    df_result = df_result.merge(iso_flag_df, on=id_column, how="left")
-    df_result["iso_flag"] = df_result["iso_flag"].fillna(False).astype(bool)
+    Parameters:
+        flags (dict): Detector name -> boolean flags by row position.
+        voting (str): "majority" (votes above half the total weight) or
+            "consensus" (the total weight).
+        weights (dict): Optional detector name -> weight (default 1).
+        min_votes (float): Flag rows whose votes reach this value instead.
 
-    df_result["vote_count"] = df_result[["zscore_flag", "iqr_flag", "iso_flag"]].sum(axis=1)
+    Returns:
+        tuple: (vote_count, is_outlier). `vote_count` is int8 with unit
+        weights, the weighted sum otherwise.
+    """
+    if not flags:
+        raise ValueError("No detector flags to vote on; run at least one detector.")
+    weights = weights or {}
+    if all(weights.get(name, 1) == 1 for name in flags):
+        vote_count = np.zeros(len(next(iter(flags.values()))), dtype=np.int8)
+        for detector_flags in flags.values():
+            vote_count += detector_flags
+    else:
+        vote_count = sum(
+            weights.get(name, 1) * detector_flags.astype(np.float64) for name, detector_flags in flags.items()
+        )
+    total = sum(weights.get(name, 1) for name in flags)
 
     #outlier decision making
-    if voting == "consensus":
-        df_result["is_outlier"] = df_result["vote_count"] == 3
+    if min_votes is not None:
+        is_outlier = vote_count >= min_votes
+    elif voting == "consensus":
+        is_outlier = vote_count >= total
     else:
-        df_result["is_outlier"] = df_result["vote_count"] >= 2
+        is_outlier = vote_count > total / 2
+    return vote_count, is_outlier
+
+
+@profiled("vote")
+def build_vote_result(df, flags, voting="majority", weights=None, min_votes=None, return_only_outliers=False):
+    """
+    Combine detector flags (name -> boolean array) into the ensemble result
+    frame, with one `<name>_flag` column per detector.
+    """
+    vote_count, is_outlier = vote(flags, voting=voting, weights=weights, min_votes=min_votes)
 
-    return df_result
+    #shallow copy: new flag columns are added without duplicating the input data
+    df_result = df.copy(deep=False)
+    for name, detector_flags in flags.items():
+        df_result[f"{name}_flag"] = detector_flags
+    df_result["vote_count"] = vote_count
+    df_result["is_outlier"] = is_outlier
+
+    return df_result[is_outlier] if return_only_outliers else df_result
+
+
+def build_ensemble_result(df, zscore_flag, iqr_flag, iso_flag, voting="majority", return_only_outliers=False):
+    """
+    Combine positional Z-score, IQR and Isolation Forest flags into the
+    ensemble result frame.
+    """
+    return build_vote_result(
+        df, {"zscore": zscore_flag, "iqr": iqr_flag, "iso": iso_flag}, voting=voting,
+        return_only_outliers=return_only_outliers,
+    )
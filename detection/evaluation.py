@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+
+from detection.features import build_numeric_matrix, column_stats
+from detection.ml_based import isolation_forest_matrix_scores
+from detection.rule_based import z_score_matrix_scores, iqr_matrix_scores
+
+
+def detector_scores(df, id_column="id", exclude_columns=None, random_state=42, time_features=False):
+    """
+    Score every row once with each detector's continuous score.
+
+    Returns:
+        dict: "zscore" (max |z|), "iqr" (distance beyond the quartiles in IQR
+        units) and "iso" (negated Isolation Forest `score_samples`), each an
+        array by row position where higher means more anomalous.
+    """
+    exclude_columns = list(dict.fromkeys([id_column] + list(exclude_columns or [])))
+    X, columns, date_cols = build_numeric_matrix(df, exclude_columns=exclude_columns, time_features=time_features)
+    stats = column_stats(X)
+    rule_columns = [j for j, col in enumerate(columns) if col not in date_cols]
+    return {
+        "zscore": z_score_matrix_scores(X, stats, columns=rule_columns),
+        "iqr": iqr_matrix_scores(X, stats, columns=rule_columns),
+        "iso": isolation_forest_matrix_scores(X, stats, random_state=random_state),
+    }
+
+
+def _ranked(scores, labels):
+    #sort descending once; cumulative true positives at every cut
+    order = np.argsort(-scores, kind="stable")
+    sorted_scores = scores[order]
+    true_positives = np.cumsum(labels[order])
+    return sorted_scores, true_positives
+
+
+def threshold_sweep(scores, labels, thresholds=None, n_thresholds=1000):
+    """
+    Precision, recall and F1 for every threshold in one vectorized pass.
+
+    A row is flagged at threshold t when its score is strictly greater than t,
+    matching the detectors' `>` comparisons.
+
+    Parameters:
+        scores (np.ndarray): Continuous scores, higher = more anomalous.
+        labels (np.ndarray): Boolean ground truth by row position.
+        thresholds (array-like): Thresholds to evaluate. If None, use
+            `n_thresholds` evenly spaced values across the finite scores.
+
+    Returns:
+        pd.DataFrame: One row per threshold with `flagged`, `flagged_fraction`,
+        `true_positives`, `precision`, `recall` and `f1`.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels, dtype=bool)
+    if thresholds is None:
+        finite = scores[np.isfinite(scores)]
+        low, high = (finite.min(), finite.max()) if finite.size else (0.0, 0.0)
+        thresholds = np.linspace(low, high, n_thresholds)
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+
+    sorted_scores, true_positives = _ranked(scores, labels)
+    #number of scores strictly above each threshold, via the ascending view of the descending sort
+    flagged = len(scores) - np.searchsorted(sorted_scores[::-1], thresholds, side="right")
+    tp = np.where(flagged > 0, true_positives[np.maximum(flagged - 1, 0)], 0)
+    positives = labels.sum()
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        precision = np.where(flagged > 0, tp / flagged, 1.0)
+        recall = tp / positives if positives else np.zeros(len(thresholds))
+        f1 = np.where(precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0)
+
+    return pd.DataFrame({
+        "threshold": thresholds,
+        "flagged": flagged,
+        "flagged_fraction": flagged / max(len(scores), 1),
+        "true_positives": tp,
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+    })
+
+
+def pr_auc(scores, labels):
+    """
+    Area under the precision-recall curve (average precision), computed from
+    one sort with ties between equal scores resolved as a single cut.
+    """
+    scores = np.asarray(scores, dtype=np.float64)
+    labels = np.asarray(labels, dtype=bool)
+    positives = labels.sum()
+    if positives == 0:
+        return 0.0
+    sorted_scores, true_positives = _ranked(scores, labels)
+    #last position of each run of equal scores is a distinct threshold
+    cut = np.r_[sorted_scores[1:] != sorted_scores[:-1], True]
+    tp = true_positives[cut]
+    flagged = np.flatnonzero(cut) + 1
+    precision = tp / flagged
+    recall = tp / positives
+    return float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+
+
+def evaluate_scores(scores, labels, thresholds=None, n_thresholds=1000):
+    """
+    Sweep every detector's saved scores.
+
+    Parameters:
+        scores (dict): Detector name -> scores, e.g. from `detector_scores`.
+        labels (np.ndarray): Boolean ground truth by row position.
+        thresholds (dict): Optional detector name -> thresholds to evaluate.
+
+    Returns:
+        tuple: (curves, summary) where `curves` stacks every sweep with a
+        `detector` column and `summary` has PR-AUC and the best-F1 operating
+        point per detector.
+    """
+    thresholds = thresholds or {}
+    curves = []
+    summary = []
+    for name, detector_scores_ in scores.items():
+        curve = threshold_sweep(detector_scores_, labels, thresholds.get(name), n_thresholds)
+        curve.insert(0, "detector", name)
+        curves.append(curve)
+        best = curve.loc[curve["f1"].idxmax()]
+        summary.append({
+            "detector": name,
+            "pr_auc": pr_auc(detector_scores_, labels),
+            "best_threshold": best["threshold"],
+            "best_f1": best["f1"],
+            "best_precision": best["precision"],
+            "best_recall": best["recall"],
+            "best_flagged_fraction": best["flagged_fraction"],
+        })
+    return pd.concat(curves, ignore_index=True), pd.DataFrame(summary)
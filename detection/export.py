@@ -0,0 +1,142 @@
+import tempfile
+
+import pandas as pd
+
+from detection.profiling import profiled
+
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+
+MIME_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+#rows per sheet in an .xlsx workbook, header included
+EXCEL_MAX_ROWS = 1_048_576
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _report_rows(result_df, outliers_only):
+    if outliers_only:
+        return result_df[result_df["is_outlier"].to_numpy(dtype=bool)]
+    return result_df
+
+
+def report_summary(result_df, voting):
+    return pd.DataFrame({
+        "Voting Strategy": [voting],
+        "Total Rows": [len(result_df)],
+        "Outliers Found": [int(result_df["is_outlier"].sum())]
+    })
+
+
+def _write_excel(rows, summary, path, chunk_rows):
+    import xlsxwriter
+
+    #constant_memory flushes each row to disk once the next one starts
+    workbook = xlsxwriter.Workbook(path, {
+        "constant_memory": True,
+        "default_date_format": "yyyy-mm-dd hh:mm:ss",
+        "remove_timezone": True,
+        "nan_inf_to_errors": True,
+    })
+    header = [str(col) for col in rows.columns]
+    sheet = None
+    sheet_row = EXCEL_MAX_ROWS
+    sheets = 0
+    for chunk in _chunks(rows, chunk_rows):
+        #blank cells for missing values, python scalars for everything else
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for record in values.itertuples(index=False, name=None):
+            if sheet_row >= EXCEL_MAX_ROWS:
+                sheets += 1
+                sheet = workbook.add_worksheet("OutlierResults" if sheets == 1 else f"OutlierResults_{sheets}")
+                sheet.write_row(0, 0, header)
+                sheet_row = 1
+            sheet.write_row(sheet_row, 0, record)
+            sheet_row += 1
+    if sheet is None:
+        workbook.add_worksheet("OutlierResults").write_row(0, 0, header)
+
+    summary_sheet = workbook.add_worksheet("Summary")
+    summary_sheet.write_row(0, 0, list(summary.columns))
+    summary_sheet.write_row(1, 0, summary.iloc[0].tolist())
+    workbook.close()
+
+
+def _write_csv(rows, path, chunk_rows):
+    rows.iloc[:0].to_csv(path, index=False)
+    for chunk in _chunks(rows, chunk_rows):
+        chunk.to_csv(path, index=False, header=False, mode="a")
+
+
+def parquet_schema(df):
+    """
+    Arrow schema for every chunk of `df`: inferred from the whole frame, with
+    columns that are entirely missing widened from null to string, so no
+    chunk can change a column's type.
+    """
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    for i, field in enumerate(schema):
+        if pa.types.is_null(field.type):
+            schema = schema.set(i, field.with_type(pa.string()))
+    return schema
+
+
+def _write_parquet(rows, path, chunk_rows):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = parquet_schema(rows)
+    with pq.ParquetWriter(path, schema) as writer:
+        for chunk in _chunks(rows, chunk_rows):
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+@profiled("export")
+def write_report(result_df, path, fmt="xlsx", outliers_only=False, voting="majority", chunk_rows=100_000):
+    """
+    Write an ensemble result to disk chunk by chunk, so memory stays flat
+    whatever the number of rows.
+
+    Parameters:
+        result_df (pd.DataFrame): Output of `build_ensemble_result`.
+        path (str or file-like): Destination.
+        fmt (str): "xlsx" (results plus a Summary sheet, split across sheets
+            past Excel's row limit), "csv" or "parquet".
+        outliers_only (bool): Only write rows with `is_outlier` set.
+        voting (str): Voting strategy recorded in the Excel summary.
+        chunk_rows (int): Rows converted per chunk.
+
+    Returns:
+        int: Number of result rows written.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; use one of {', '.join(EXPORT_FORMATS)}.")
+    rows = _report_rows(result_df, outliers_only)
+    if fmt == "xlsx":
+        _write_excel(rows, report_summary(result_df, voting), path, chunk_rows)
+    elif fmt == "csv":
+        _write_csv(rows, path, chunk_rows)
+    else:
+        _write_parquet(rows, path, chunk_rows)
+    return len(rows)
+
+
+def export_report(result_df, fmt="xlsx", outliers_only=False, voting="majority", chunk_rows=100_000):
+    """
+    Write the report to an anonymous temporary file and return it open and
+    rewound; the file is removed when it is closed. Streamlit only serves
+    bytes, so read and close it before handing the report to a download.
+    """
+    handle = tempfile.TemporaryFile(suffix=f".{fmt}")
+    write_report(result_df, handle, fmt=fmt, outliers_only=outliers_only, voting=voting, chunk_rows=chunk_rows)
+    handle.seek(0)
+    return handle
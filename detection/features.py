@@ -0,0 +1,141 @@
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from detection.profiling import profiled, stage
+from detection.schema import (
+    TIME_FEATURES, cached_schema, is_datetime_column, parse_datetime, time_feature_source, time_feature_values
+)
+
+
+def categorical_columns(df, exclude_columns=None):
+    """
+    Columns that are neither numeric, boolean nor datetime (object, string
+    and category dtypes), in DataFrame order.
+    """
+    exclude_columns = set(exclude_columns or [])
+    return [
+        col for col in df.columns
+        if col not in exclude_columns
+        and not pd.api.types.is_numeric_dtype(df[col])
+        and not pd.api.types.is_bool_dtype(df[col])
+        and not pd.api.types.is_datetime64_any_dtype(df[col])
+    ]
+
+
+def build_numeric_matrix(df, exclude_columns=None, include_dates=True, time_features=False, schema=None):
+    """
+    Project the numeric (and optionally date-like) columns of a DataFrame into
+    a single float64 matrix.
+
+    Date-like columns are converted to epoch seconds and keep their position
+    among the numeric columns. The matrix is built in column-major order, one
+    column at a time, so it costs one copy of the numeric data.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        exclude_columns (list): Columns to leave out of the matrix.
+        include_dates (bool): If True, parse object columns whose name contains
+            "time" or "date" and include them as epoch seconds.
+        time_features (bool): If True, follow each date column with
+            `<column>_hour` and `<column>_dayofweek` features.
+        schema (dict): Column roles from `infer_schema`, whose date formats
+            are used for parsing. Defaults to the cached schema for `df`.
+
+    Returns:
+        tuple: (X, columns, date_cols) where ``columns`` names each column of
+        X and ``date_cols`` lists the parsed date columns. Unparseable dates are NaN.
+    """
+    exclude_columns = set(exclude_columns or [])
+    candidates = [col for col in df.columns if col not in exclude_columns]
+
+    with stage("type_inference", "numeric_columns", rows=len(df)):
+        numeric_cols = [
+            col for col in candidates
+            if pd.api.types.is_numeric_dtype(df[col]) and not pd.api.types.is_bool_dtype(df[col])
+        ]
+
+    date_values = {}
+    if include_dates:
+        date_formats = (schema or cached_schema(df))["datetime"]
+        with stage("preprocess", "parse_dates", rows=len(df)):
+            for col in candidates:
+                if col in numeric_cols or not is_datetime_column(col):
+                    continue
+                parsed = parse_datetime(df[col], date_formats.get(col))
+                if parsed.notna().any():
+                    date_values[col] = parsed
+
+    #keep the original column order so the forest sees features as before
+    columns = []
+    for col in candidates:
+        if col in numeric_cols:
+            columns.append(col)
+        elif col in date_values:
+            columns.append(col)
+            if time_features:
+                columns.extend(f"{col}_{feature}" for feature in TIME_FEATURES)
+    date_cols = list(date_values)
+
+    return project_columns(df, columns, date_cols, parsed_dates=date_values), columns, date_cols
+
+
+@profiled("preprocess")
+def project_columns(df, columns, date_cols=(), parsed_dates=None, date_formats=None):
+    """
+    Build the float64 matrix for a fixed list of columns, e.g. the columns a
+    fitted model was trained on. Columns listed in `date_cols` are parsed
+    (with `date_formats` where known) and converted to epoch seconds; derived
+    `<date column>_hour` / `_dayofweek` columns are computed from them.
+    """
+    parsed_dates = parsed_dates or {}
+    date_formats = date_formats or {}
+    X = np.empty((len(df), len(columns)), dtype=np.float64, order="F")
+    seconds = {}
+    for j, col in enumerate(columns):
+        derived = time_feature_source(col, date_cols) if col not in df.columns else None
+        if col in date_cols or derived is not None:
+            source = col if derived is None else derived[0]
+            if source not in seconds:
+                parsed = parsed_dates.get(source)
+                if parsed is None:
+                    parsed = parse_datetime(df[source], date_formats.get(source))
+                values = parsed.to_numpy(dtype="datetime64[s]").astype(np.int64).astype(np.float64)
+                values[parsed.isna().to_numpy()] = np.nan
+                seconds[source] = values
+            X[:, j] = seconds[source] if derived is None else time_feature_values(seconds[source], derived[1])
+        else:
+            X[:, j] = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+    return X
+
+
+@profiled("fit")
+def column_stats(X):
+    """
+    Compute per-column statistics for a float matrix in one vectorized pass.
+
+    NaNs are ignored, matching pandas' ``mean``/``std``/``quantile`` defaults.
+
+    Returns:
+        dict: Arrays keyed by ``count``, ``mean``, ``std`` (ddof=1), ``q1``,
+        ``median`` and ``q3``, each with one entry per column.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        count = np.count_nonzero(~np.isnan(X), axis=0)
+        mean = np.nanmean(X, axis=0)
+        std = np.nanstd(X, axis=0, ddof=1)
+        if len(X) and (count == len(X)).all():
+            q1, median, q3 = np.quantile(X, [0.25, 0.5, 0.75], axis=0)
+        else:
+            q1, median, q3 = np.nanquantile(X, [0.25, 0.5, 0.75], axis=0)
+
+    return {
+        "count": count.astype(np.int64),
+        "mean": np.atleast_1d(mean),
+        "std": np.atleast_1d(std),
+        "q1": np.atleast_1d(q1),
+        "median": np.atleast_1d(median),
+        "q3": np.atleast_1d(q3),
+    }
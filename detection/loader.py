@@ -0,0 +1,151 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from detection.profiling import profiled, stage
+from detection.schema import is_datetime_column
+
+COLUMNAR_EXTENSIONS = (".parquet", ".pq", ".feather", ".arrow")
+
+
+def _extension(source, file_name=None):
+    name = file_name or (source if isinstance(source, (str, os.PathLike)) else getattr(source, "name", ""))
+    return os.path.splitext(str(name))[1].lower()
+
+
+def _as_buffer(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return io.BytesIO(source)
+    return source
+
+
+def _arrow_schema(source, extension):
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+
+    if extension in (".parquet", ".pq"):
+        return pq.read_schema(source)
+    return feather.read_table(source, memory_map=isinstance(source, (str, os.PathLike))).schema
+
+
+def detector_columns(source, id_column=None, file_name=None, include_categorical=True, sample_rows=1000):
+    """
+    Names of the columns the detectors read: numeric columns, date-like
+    columns (by name, as in `build_numeric_matrix`), the ID column and, if
+    `include_categorical`, string columns for the forest's categorical path
+    (on by default, like the encoding; False only for numeric-only scoring).
+
+    Parquet/Arrow sources are inspected from their schema without reading
+    data; CSV/Excel sources from the first `sample_rows` rows.
+    """
+    extension = _extension(source, file_name)
+    if extension in COLUMNAR_EXTENSIONS:
+        import pyarrow.types as pat
+
+        buffer = _as_buffer(source)
+        schema = _arrow_schema(buffer, extension)
+        if hasattr(buffer, "seek"):
+            buffer.seek(0)
+        columns = []
+        for field in schema:
+            numeric = pat.is_integer(field.type) or pat.is_floating(field.type) or pat.is_decimal(field.type)
+            temporal = pat.is_temporal(field.type) or is_datetime_column(field.name)
+            categorical = include_categorical and (
+                pat.is_string(field.type) or pat.is_large_string(field.type) or pat.is_dictionary(field.type)
+            )
+            if numeric or temporal or categorical or field.name == id_column:
+                columns.append(field.name)
+        return columns
+
+    buffer = _as_buffer(source)
+    if extension in (".xlsx", ".xls"):
+        sample = pd.read_excel(buffer, nrows=sample_rows)
+    else:
+        sample = pd.read_csv(buffer, nrows=sample_rows)
+    if hasattr(buffer, "seek"):
+        buffer.seek(0)
+    return [
+        col for col in sample.columns
+        if col == id_column
+        or pd.api.types.is_numeric_dtype(sample[col])
+        or pd.api.types.is_datetime64_any_dtype(sample[col])
+        or is_datetime_column(col)
+        or (include_categorical and not pd.api.types.is_bool_dtype(sample[col]))
+    ]
+
+
+@profiled("type_inference")
+def compact_dtypes(df, category_ratio=0.5):
+    """
+    Shrink a DataFrame in place of its wide dtypes:
+
+    - integers are downcast to the smallest type that holds their range;
+    - floats are downcast to float32 only when that is lossless;
+    - string columns whose distinct values are at most `category_ratio` of
+      the rows become `category`, except date-like columns, which stay
+      strings for date parsing.
+    """
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+        if pd.api.types.is_integer_dtype(series):
+            df[col] = pd.to_numeric(series, downcast="integer")
+        elif pd.api.types.is_float_dtype(series):
+            values = series.to_numpy()
+            downcast = values.astype(np.float32)
+            if np.array_equal(downcast.astype(values.dtype), values, equal_nan=True):
+                df[col] = downcast
+        elif (
+            not pd.api.types.is_numeric_dtype(series)
+            and not pd.api.types.is_datetime64_any_dtype(series)
+            and not isinstance(series.dtype, pd.CategoricalDtype)
+            and not is_datetime_column(col)
+            and len(series)
+            and series.nunique(dropna=True) <= category_ratio * len(series)
+        ):
+            df[col] = series.astype("category")
+    return df
+
+
+def load_dataset(source, columns=None, file_name=None, compact=True, category_ratio=0.5, memory_map=True):
+    """
+    Load a dataset from CSV, Excel, Parquet or Arrow/Feather.
+
+    Parameters:
+        source: Path, file-like object or raw bytes (e.g. an upload).
+        columns (list): Columns to read. Parquet/Arrow read only these column
+            chunks; CSV skips parsing the others. See `detector_columns`.
+        file_name (str): Name used to pick the format when `source` has none.
+        compact (bool): Apply `compact_dtypes` after loading.
+        category_ratio (float): Distinct-value ratio below which strings
+            become `category`.
+        memory_map (bool): Memory-map Parquet/Arrow files read from disk.
+
+    Returns:
+        pd.DataFrame
+    """
+    extension = _extension(source, file_name)
+    buffer = _as_buffer(source)
+    on_disk = isinstance(buffer, (str, os.PathLike))
+
+    with stage("parse", "load_dataset") as timed:
+        if extension in (".parquet", ".pq"):
+            import pyarrow.parquet as pq
+
+            df = pq.read_table(buffer, columns=columns, memory_map=memory_map and on_disk).to_pandas()
+        elif extension in (".feather", ".arrow"):
+            import pyarrow.feather as feather
+
+            df = feather.read_table(buffer, columns=columns, memory_map=memory_map and on_disk).to_pandas()
+        elif extension in (".xlsx", ".xls"):
+            df = pd.read_excel(buffer, usecols=columns)
+        else:
+            df = pd.read_csv(buffer, usecols=columns)
+
+        if columns is not None:
+            df = df[[col for col in columns if col in df.columns]]
+        timed.rows = len(df)
+    return compact_dtypes(df, category_ratio=category_ratio) if compact else df
@@ -1,59 +1,179 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
+from scipy import sparse
+from sklearn.base import BaseEstimator, TransformerMixin
 from sklearn.ensemble import IsolationForest
-from sklearn.preprocessing import StandardScaler, FunctionTransformer
+from sklearn.neighbors import LocalOutlierFactor
+from sklearn.preprocessing import StandardScaler, FunctionTransformer, OneHotEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.impute import SimpleImputer
 
+from detection.features import categorical_columns
+from detection.schema import add_time_features, cached_schema, is_datetime_column, parse_datetime
+from detection.profiling import profiled, stage
+
+CATEGORICAL_ENCODINGS = ("onehot", "hash", "frequency")
+
+#one float column per categorical column: rare merchants, IPs or departments isolate quickly
+DEFAULT_CATEGORICAL_ENCODING = "frequency"
+
+#rows transformed and scored per task in the chunked forest path
+FOREST_CHUNK_ROWS = 100_000
+
 def log_transform(x):
     x = np.where(x < -0.99, 0, x)
     x = np.nan_to_num(x, nan=0.0, posinf=0.0, neginf=0.0)
     return np.log1p(x)
 
+
+class SparseCategoricalEncoder(BaseEstimator, TransformerMixin):
+    """
+    Memory-bounded encoder for categorical columns feeding the Isolation Forest.
+
+    Methods:
+        "onehot": sparse one-hot; levels rarer than `min_frequency` share one
+            "infrequent" column and unseen levels map there too.
+        "hash": each `column=value` pair is hashed into `n_features` sparse
+            columns with vectorized `pd.util.hash_array`; nothing is fitted.
+        "frequency": each value is replaced by its training frequency (unseen
+            levels get 0), one dense float column per input column.
+
+    Sparse outputs are CSR float32 with exactly one non-zero per row and
+    column, so memory grows with rows x categorical columns, not with the
+    number of levels.
+    """
+
+    def __init__(self, method="onehot", min_frequency=0.01, n_features=2**12):
+        self.method = method
+        self.min_frequency = min_frequency
+        self.n_features = n_features
+
+    @staticmethod
+    def _as_frame(X):
+        frame = pd.DataFrame(X)
+        return frame.astype(object).where(frame.notna(), "__missing__").astype(str)
+
+    def fit(self, X, y=None):
+        if self.method not in CATEGORICAL_ENCODINGS:
+            raise ValueError(f"Unknown categorical encoding {self.method!r}; use one of {CATEGORICAL_ENCODINGS}.")
+        frame = self._as_frame(X)
+        if self.method == "onehot":
+            self.encoder_ = OneHotEncoder(
+                handle_unknown="infrequent_if_exist", min_frequency=self.min_frequency,
+                sparse_output=True, dtype=np.float32,
+            ).fit(frame)
+        elif self.method == "frequency":
+            self.frequencies_ = [frame[col].value_counts(normalize=True) for col in frame.columns]
+        return self
+
+    def _hash(self, frame):
+        n_rows, n_cols = frame.shape
+        indices = np.empty((n_rows, n_cols), dtype=np.int64)
+        for j, col in enumerate(frame.columns):
+            #offset each column so equal values in different columns land in different buckets
+            offset = np.uint64((j * 0x9E3779B97F4A7C15) % 2**64)
+            hashed = pd.util.hash_array(frame[col].to_numpy(dtype=object), categorize=True)
+            indices[:, j] = ((hashed + offset) % np.uint64(self.n_features)).astype(np.int64)
+        matrix = sparse.csr_matrix(
+            (np.ones(indices.size, dtype=np.float32), indices.ravel(), np.arange(0, indices.size + 1, n_cols)),
+            shape=(n_rows, self.n_features),
+        )
+        matrix.sum_duplicates()
+        return matrix
+
+    def transform(self, X):
+        frame = self._as_frame(X)
+        if self.method == "onehot":
+            return self.encoder_.transform(frame)
+        if self.method == "hash":
+            return self._hash(frame)
+        encoded = np.empty(frame.shape, dtype=np.float32)
+        for j, (col, frequencies) in enumerate(zip(frame.columns, self.frequencies_)):
+            encoded[:, j] = frame[col].map(frequencies).fillna(0.0).to_numpy(dtype=np.float32)
+        return encoded
+
+
 def detect_robust_isolation_forest_outliers(
-    df, exclude_columns=None, return_only_outliers=False, id_column="id", random_state=42
+    df, exclude_columns=None, return_only_outliers=False, id_column="id", random_state=42,
+    categorical_encoding=DEFAULT_CATEGORICAL_ENCODING, min_frequency=0.01, n_features=2**12, sample_size=None,
+    stratify=None, chunk_rows=FOREST_CHUNK_ROWS, n_jobs=None, time_features=False
 ):
+    """
+    Detect outliers with an Isolation Forest over log-scaled numeric columns,
+    date columns (as epoch seconds) and, optionally, categorical columns.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        exclude_columns (list): Columns to leave out of the model.
+        return_only_outliers (bool): If True, return only the outlier IDs.
+        id_column (str): ID column used when `return_only_outliers` is True.
+        random_state (int): Isolation Forest seed.
+        categorical_encoding (str): "frequency" (default), "onehot", "hash"
+            or None (numeric only); see `SparseCategoricalEncoder`.
+        min_frequency (float): Rare-level cutoff for "onehot".
+        n_features (int): Hash space size for "hash".
+        sample_size (int): Large-data mode. Fit the preprocessor and forest
+            on at most this many rows, then transform and score all rows in
+            `chunk_rows` chunks across `n_jobs` threads. None fits on everything.
+        stratify (str): Column whose values the sample keeps in proportion.
+        chunk_rows (int): Rows per scoring chunk in large-data mode.
+        n_jobs (int): Scoring threads (default: CPU count).
+        time_features (bool): Add hour-of-day and day-of-week features for
+            every date column.
+
+    Returns:
+        pd.DataFrame: DataFrame with an `is_outlier` column (or a list of IDs).
+    """
     exclude_columns = exclude_columns or []
+    schema = cached_schema(df)
     df_model = df.drop(columns=exclude_columns, errors="ignore").copy()
+    if time_features:
+        df_model = add_time_features(df_model, schema)
 
-    for col in df_model.columns:
-        if "time" in col.lower() or "date" in col.lower():
-            parsed = pd.to_datetime(df_model[col], errors="coerce")
-            if parsed.notna().sum() > 0:
-                df_model[col] = parsed.astype("int64") // 10**9
+    with stage("preprocess", "parse_dates", rows=len(df_model)):
+        for col in df_model.columns:
+            #numeric columns (including derived time features) are already numbers
+            if is_datetime_column(col) and not pd.api.types.is_numeric_dtype(df_model[col]):
+                parsed = parse_datetime(df_model[col], schema["datetime"].get(col))
+                if parsed.notna().sum() > 0:
+                    df_model[col] = parsed.astype("datetime64[s]").astype("int64")
 
     numeric_cols = df_model.select_dtypes(include=[np.number]).columns.tolist()
-    categorical_cols = df_model.select_dtypes(include=["object", "category"]).columns.tolist()
-
-    from sklearn.preprocessing import OneHotEncoder
-
-    cat_pipeline = Pipeline([
-        ("imputer", SimpleImputer(strategy="most_frequent")),
-        ("onehot", OneHotEncoder(handle_unknown="ignore", sparse_output=False))
-    ])
-
+    categorical_cols = categorical_columns(df_model)
 
     num_pipeline = Pipeline([
             ("imputer", SimpleImputer(strategy="median")),
             ("log", FunctionTransformer(log_transform, validate=False)),
             ("scaler", StandardScaler()),
         ])
-    preprocessor = ColumnTransformer(transformers=[
-        ("num", num_pipeline, numeric_cols),
-        ("cat", cat_pipeline, categorical_cols),
-    ])
+    transformers = [("num", num_pipeline, numeric_cols)]
+    if categorical_encoding is not None and categorical_cols:
+        cat_encoder = SparseCategoricalEncoder(categorical_encoding, min_frequency=min_frequency, n_features=n_features)
+        transformers.append(("cat", cat_encoder, categorical_cols))
 
-    
+    #sparse_threshold=1.0 keeps the stacked output sparse whenever the categorical part is sparse
+    preprocessor = ColumnTransformer(transformers=transformers, sparse_threshold=1.0)
 
-    preprocessor = ColumnTransformer(transformers=[
-        ("num", num_pipeline, numeric_cols)
-    ])
+    if sample_size is not None:
+        strata = None if stratify is None else df[stratify].to_numpy()
+        outlier_preds = _sampled_pipeline_predict(
+            preprocessor, df_model, 0.05, random_state, sample_size, strata, chunk_rows, n_jobs
+        )
+    else:
+        with stage("preprocess", "column_transformer", rows=len(df_model)):
+            X = preprocessor.fit_transform(df_model)
+            if sparse.issparse(X):
+                X = X.tocsc()
 
-    X = preprocessor.fit_transform(df_model)
-
-    model = IsolationForest(contamination=0.05, random_state=random_state)
-    outlier_preds = model.fit_predict(X)
+        model = IsolationForest(contamination=0.05, random_state=random_state)
+        with stage("fit", "isolation_forest", rows=X.shape[0]):
+            model.fit(X)
+        with stage("score", "isolation_forest", rows=X.shape[0]):
+            outlier_preds = model.predict(X)
 
     df_result = df.copy()
     df_result["is_outlier"] = (outlier_preds == -1).astype(int)
@@ -62,3 +182,257 @@ def detect_robust_isolation_forest_outliers(
         return df_result[df_result["is_outlier"] == 1][id_column].tolist()
 
     return df_result
+
+
+def _sampled_pipeline_predict(
+    preprocessor, df_model, contamination, random_state, sample_size, strata, chunk_rows, n_jobs
+):
+    #fit on a sample, then transform and score every row chunk by chunk; +1 inlier / -1 outlier like `predict`
+    rows = sample_indices(len(df_model), sample_size, random_state=random_state, strata=strata)
+    sample = df_model.iloc[rows]
+    with stage("preprocess", "column_transformer", rows=len(sample)):
+        X_sample = preprocessor.fit(sample).transform(sample)
+        if sparse.issparse(X_sample):
+            X_sample = X_sample.tocsc()
+
+    model = IsolationForest(contamination="auto", random_state=random_state)
+    with stage("fit", "isolation_forest", rows=len(rows)):
+        model.fit(X_sample)
+    del sample, X_sample
+
+    def score_chunk(chunk):
+        X_chunk = preprocessor.transform(df_model.iloc[chunk])
+        return model.score_samples(X_chunk.tocsr() if sparse.issparse(X_chunk) else X_chunk)
+
+    with stage("score", "isolation_forest", rows=len(df_model)):
+        scores = _map_chunks(score_chunk, len(df_model), chunk_rows, n_jobs)
+    return np.where(scores < np.percentile(scores, 100.0 * contamination), -1, 1)
+
+
+@profiled("preprocess")
+def forest_input_matrix(X, medians, center=None, scale=None):
+    """
+    Apply the numeric pipeline (median impute, log transform, standardize)
+    column by column and return the float32 matrix the forest works on.
+
+    When `center`/`scale` are None they are fitted on X; pass the fitted
+    values back in to transform new batches exactly like the training data.
+
+    Returns:
+        tuple: (X_forest, center, scale)
+    """
+    fit = center is None
+    if fit:
+        center = np.zeros(X.shape[1])
+        scale = np.ones(X.shape[1])
+
+    X_forest = np.empty(X.shape, dtype=np.float32)
+    for j in range(X.shape[1]):
+        fill = medians[j] if np.isfinite(medians[j]) else 0.0
+        column = log_transform(np.where(np.isnan(X[:, j]), fill, X[:, j]))
+        if fit:
+            std = column.std()
+            center[j] = column.mean()
+            scale[j] = std if std > 0 else 1.0
+        X_forest[:, j] = (column - center[j]) / scale[j]
+    return X_forest, center, scale
+
+
+def stack_forest_input(X_forest, categorical=None):
+    """
+    Append encoded categorical features (from `SparseCategoricalEncoder`) to
+    the numeric forest input. Sparse encodings keep the result sparse (CSC,
+    the layout the forest fits on).
+    """
+    if categorical is None:
+        return X_forest
+    if sparse.issparse(categorical):
+        return sparse.hstack([sparse.csc_matrix(X_forest), categorical], format="csc", dtype=np.float32)
+    return np.hstack([X_forest, categorical.astype(np.float32)])
+
+
+def sample_indices(n_rows, sample_size, random_state=42, strata=None):
+    """
+    Sorted row positions of a sample drawn without replacement; every row
+    when `n_rows <= sample_size`.
+
+    Parameters:
+        n_rows (int): Number of rows to sample from.
+        sample_size (int): Target sample size.
+        random_state (int): Sampling seed.
+        strata (array-like): Optional label per row (e.g. department). Each
+            stratum keeps its share of the sample, and at least one row.
+
+    Returns:
+        np.ndarray: Row positions.
+    """
+    if n_rows <= sample_size:
+        return np.arange(n_rows)
+    rng = np.random.default_rng(random_state)
+    if strata is None:
+        return np.sort(rng.choice(n_rows, size=sample_size, replace=False))
+
+    codes = pd.factorize(np.asarray(strata), use_na_sentinel=False)[0]
+    counts = np.bincount(codes)
+    quota = np.minimum(np.maximum(np.round(counts * sample_size / n_rows), 1), counts).astype(np.int64)
+
+    #shuffle, group rows by stratum, then keep the first `quota` rows of each group
+    order = rng.permutation(n_rows)
+    order = order[np.argsort(codes[order], kind="stable")]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    sorted_codes = codes[order]
+    rank = np.arange(n_rows) - starts[sorted_codes]
+    return np.sort(order[rank < quota[sorted_codes]])
+
+
+def _map_chunks(func, n_rows, chunk_rows, n_jobs):
+    #apply `func` to consecutive row slices across a thread pool and concatenate in order
+    chunks = [slice(start, start + chunk_rows) for start in range(0, n_rows, chunk_rows)]
+    if not chunks:
+        return np.empty(0)
+    workers = min(n_jobs or os.cpu_count() or 1, len(chunks))
+    if workers == 1:
+        return np.concatenate([func(rows) for rows in chunks])
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return np.concatenate(list(pool.map(func, chunks)))
+
+
+def _forest_chunk_scores(model, X, medians, center, scale, categorical, rows):
+    X_forest, _, _ = forest_input_matrix(X[rows], medians, center, scale)
+    chunk_categorical = None if categorical is None else categorical[rows]
+    return model.score_samples(stack_forest_input(X_forest, chunk_categorical))
+
+
+def isolation_forest_chunk_scores(
+    model, X, medians, center, scale, categorical=None, chunk_rows=FOREST_CHUNK_ROWS, n_jobs=None
+):
+    """
+    `score_samples` for every row of X, transforming and scoring fixed-size
+    row chunks across a thread pool (tree traversal releases the GIL), so
+    only one transformed chunk per worker is held at a time.
+
+    Returns:
+        np.ndarray: Scores by row position, lower is more anomalous.
+    """
+    if categorical is not None and sparse.issparse(categorical):
+        categorical = categorical.tocsr()
+    with stage("score", "isolation_forest", rows=len(X)):
+        return _map_chunks(
+            lambda rows: _forest_chunk_scores(model, X, medians, center, scale, categorical, rows),
+            len(X), chunk_rows, n_jobs,
+        )
+
+
+def fit_sampled_isolation_forest_matrix(
+    X, stats, contamination=0.05, random_state=42, categorical=None, sample_size=200_000, strata=None,
+    chunk_rows=FOREST_CHUNK_ROWS, n_jobs=None
+):
+    """
+    Large-data variant of `fit_isolation_forest_matrix`: the standardization
+    and the forest are fitted on a sample, then every row is scored in
+    parallel chunks and the contamination cut is taken over all scores.
+
+    When the sample covers every row the flags are identical to the
+    in-memory path, since the forest's own offset is the same percentile of
+    the training scores.
+
+    Returns:
+        tuple: (model, center, scale, flags), as `fit_isolation_forest_matrix`.
+    """
+    rows = sample_indices(len(X), sample_size, random_state=random_state, strata=strata)
+    X_sample, center, scale = forest_input_matrix(X[rows], stats["median"])
+    sample_categorical = None
+    if categorical is not None:
+        sample_categorical = (categorical.tocsr() if sparse.issparse(categorical) else categorical)[rows]
+
+    #"auto" skips the forest's own scoring pass; the offset is set from the full scores below
+    model = IsolationForest(contamination="auto", random_state=random_state)
+    with stage("fit", "isolation_forest", rows=len(rows)):
+        model.fit(stack_forest_input(X_sample, sample_categorical))
+    del X_sample, sample_categorical
+
+    scores = isolation_forest_chunk_scores(
+        model, X, stats["median"], center, scale, categorical, chunk_rows=chunk_rows, n_jobs=n_jobs
+    )
+    model.set_params(contamination=contamination)
+    model.offset_ = np.percentile(scores, 100.0 * contamination)
+    return model, center, scale, scores < model.offset_
+
+
+def fit_isolation_forest_matrix(
+    X, stats, contamination=0.05, random_state=42, categorical=None, sample_size=None, strata=None, n_jobs=None
+):
+    """
+    Fit an Isolation Forest on a shared numeric matrix, optionally with
+    encoded categorical features appended.
+
+    With `sample_size`, fit on a sample and score in parallel chunks; see
+    `fit_sampled_isolation_forest_matrix`.
+
+    Returns:
+        tuple: (model, center, scale, flags) where `flags` are the training-row
+        predictions and `center`/`scale` are the fitted standardization.
+    """
+    if sample_size is not None:
+        return fit_sampled_isolation_forest_matrix(
+            X, stats, contamination, random_state, categorical, sample_size=sample_size, strata=strata,
+            n_jobs=n_jobs,
+        )
+    X_forest, center, scale = forest_input_matrix(X, stats["median"])
+    X_forest = stack_forest_input(X_forest, categorical)
+    model = IsolationForest(contamination=contamination, random_state=random_state)
+    with stage("fit", "isolation_forest", rows=X_forest.shape[0]):
+        model.fit(X_forest)
+    with stage("score", "isolation_forest", rows=X_forest.shape[0]):
+        flags = model.predict(X_forest) == -1
+    return model, center, scale, flags
+
+
+def isolation_forest_matrix_flags(
+    X, stats, contamination=0.05, random_state=42, categorical=None, sample_size=None, strata=None, n_jobs=None
+):
+    """
+    Fit an Isolation Forest on a shared numeric matrix and return boolean flags.
+
+    Equivalent to `detect_robust_isolation_forest_outliers` without rebuilding
+    a DataFrame or a ColumnTransformer.
+    """
+    n_features = X.shape[1] + (0 if categorical is None else categorical.shape[1])
+    if n_features == 0 or len(X) == 0:
+        return np.zeros(len(X), dtype=bool)
+    return fit_isolation_forest_matrix(
+        X, stats, contamination, random_state, categorical, sample_size=sample_size, strata=strata, n_jobs=n_jobs
+    )[3]
+
+
+def lof_matrix_flags(X, stats, contamination=0.05, n_neighbors=20, n_jobs=None):
+    """
+    Local Outlier Factor flags on the same imputed, log-scaled and
+    standardized input the Isolation Forest uses. Density-based, so it
+    catches rows that are unusual for their neighbourhood rather than for
+    the whole column.
+    """
+    if X.shape[1] == 0 or len(X) < 2:
+        return np.zeros(len(X), dtype=bool)
+    X_forest, _, _ = forest_input_matrix(X, stats["median"])
+    model = LocalOutlierFactor(n_neighbors=min(n_neighbors, len(X) - 1), contamination=contamination, n_jobs=n_jobs)
+    with stage("fit", "local_outlier_factor", rows=len(X)):
+        return model.fit_predict(X_forest) == -1
+
+
+def isolation_forest_matrix_scores(X, stats, random_state=42, categorical=None):
+    """
+    Continuous anomaly score per row (the negated `score_samples`, so higher
+    is more anomalous). Contamination only moves the decision offset, so a
+    contamination sweep is a threshold sweep over these scores.
+    """
+    n_features = X.shape[1] + (0 if categorical is None else categorical.shape[1])
+    if n_features == 0 or len(X) == 0:
+        return np.full(len(X), -np.inf)
+    X_forest, _, _ = forest_input_matrix(X, stats["median"])
+    X_forest = stack_forest_input(X_forest, categorical)
+    model = IsolationForest(random_state=random_state)
+    with stage("fit", "isolation_forest", rows=X_forest.shape[0]):
+        model.fit(X_forest)
+    with stage("score", "isolation_forest", rows=X_forest.shape[0]):
+        return -model.score_samples(X_forest)
@@ -0,0 +1,280 @@
+import json
+import os
+
+import joblib
+import numpy as np
+import sklearn
+
+from detection.aggregation import EntityAggregator, add_entity_features
+from detection.ensemble import build_ensemble_result
+from detection.features import build_numeric_matrix, categorical_columns, column_stats, project_columns
+from detection.ml_based import (
+    DEFAULT_CATEGORICAL_ENCODING, SparseCategoricalEncoder, fit_isolation_forest_matrix, isolation_forest_chunk_scores
+)
+from detection.rule_based import z_score_matrix_flags, iqr_matrix_flags
+from detection.schema import cached_schema
+
+#2: categorical encoder and date formats in meta.json; 3: entity aggregator
+MODEL_VERSION = 3
+STAT_NAMES = ["count", "mean", "std", "q1", "median", "q3"]
+
+
+def fit_detector_model(
+    df, id_column="id", exclude_columns=None, contamination=0.05, random_state=42,
+    categorical_encoding=DEFAULT_CATEGORICAL_ENCODING, forest_sample_size=None, n_jobs=None, time_features=False,
+    entity_windows=None, entity_aggregator=None
+):
+    """
+    Fit the baseline used by the Z-score, IQR, Isolation Forest and ensemble
+    detectors so new batches can be scored without refitting.
+
+    Parameters:
+        df (pd.DataFrame): Baseline data.
+        id_column (str): ID column, always excluded from scoring.
+        exclude_columns (list): Extra columns to exclude from scoring.
+        contamination (float): Isolation Forest contamination.
+        random_state (int): Isolation Forest seed.
+        categorical_encoding (str): "frequency" (default), "onehot", "hash"
+            or None; fits a `SparseCategoricalEncoder` for the forest.
+        forest_sample_size (int): Fit the forest on a sample of at most this
+            many rows; the contamination cut still uses every row's score.
+        n_jobs (int): Threads for chunked forest scoring.
+        time_features (bool): Add hour-of-day and day-of-week features for
+            every date column; scoring recomputes them from the dates.
+        entity_windows (list): Window lengths, e.g. ["1h", "1D"]; adds
+            per-entity aggregates (see `detection.aggregation`). The fitted
+            `EntityAggregator` keeps each entity's recent history, so scoring
+            a new batch only updates it with that batch.
+        entity_aggregator (EntityAggregator): Use this aggregator instead,
+            already advanced by `df`, whose aggregate columns `df` carries.
+
+    Returns:
+        dict: Fitted model with column layout, per-column statistics, the
+        forest's standardization, the categorical encoder (or None), the
+        entity aggregator (or None) and the fitted `IsolationForest`.
+    """
+    aggregator = entity_aggregator
+    if aggregator is None and entity_windows:
+        aggregator = EntityAggregator(windows=entity_windows, id_column=id_column)
+        df = add_entity_features(df, aggregator=aggregator)
+
+    exclude_columns = list(dict.fromkeys([id_column] + list(exclude_columns or [])))
+    schema = cached_schema(df, id_column=id_column)
+    X, columns, date_cols = build_numeric_matrix(
+        df, exclude_columns=exclude_columns, time_features=time_features, schema=schema
+    )
+    stats = column_stats(X)
+
+    cat_cols, encoder, categorical = [], None, None
+    if categorical_encoding is not None:
+        cat_cols = categorical_columns(df, exclude_columns=exclude_columns + date_cols)
+        if cat_cols:
+            encoder = SparseCategoricalEncoder(categorical_encoding)
+            categorical = encoder.fit_transform(df[cat_cols])
+        else:
+            cat_cols = []
+
+    forest, center, scale = None, np.zeros(len(columns)), np.ones(len(columns))
+    if (columns or cat_cols) and len(X):
+        forest, center, scale, _ = fit_isolation_forest_matrix(
+            X, stats, contamination=contamination, random_state=random_state, categorical=categorical,
+            sample_size=forest_sample_size, n_jobs=n_jobs,
+        )
+
+    return {
+        "version": MODEL_VERSION,
+        "id_column": id_column,
+        "columns": columns,
+        "date_cols": date_cols,
+        "date_formats": {col: schema["datetime"].get(col) for col in date_cols},
+        "stats": stats,
+        "forest_center": center,
+        "forest_scale": scale,
+        "categorical_columns": cat_cols,
+        "categorical_encoder": encoder,
+        "entity_aggregator": aggregator,
+        "forest": forest,
+        "params": {
+            "contamination": contamination, "random_state": random_state, "forest_sample_size": forest_sample_size,
+            "entity_windows": aggregator.windows if aggregator is not None else None,
+        },
+    }
+
+
+def entity_features(model, df):
+    """
+    Add the model's entity aggregates to a new batch, advancing its
+    aggregator by the batch. A no-op without an aggregator or when `df`
+    already has the aggregate columns, so a batch prepared once can be
+    scored by several detectors; otherwise pass each batch once, in order.
+    """
+    aggregator = model["entity_aggregator"]
+    if aggregator is None or all(col in df.columns for col in aggregator.feature_columns):
+        return df
+    return add_entity_features(df, aggregator=aggregator)
+
+
+def _rule_columns(model):
+    return [j for j, col in enumerate(model["columns"]) if col not in model["date_cols"]]
+
+
+def _project(model, df):
+    return project_columns(df, model["columns"], model["date_cols"], date_formats=model["date_formats"])
+
+
+def _z_score_flags(model, X, threshold):
+    return z_score_matrix_flags(X, model["stats"], threshold=threshold, columns=_rule_columns(model))
+
+
+def _iqr_flags(model, X, k):
+    return iqr_matrix_flags(X, model["stats"], k=k, columns=_rule_columns(model))
+
+
+def _isolation_forest_flags(model, X, df):
+    if model["forest"] is None:
+        return np.zeros(len(X), dtype=bool)
+    categorical = None
+    if model["categorical_encoder"] is not None:
+        categorical = model["categorical_encoder"].transform(df[model["categorical_columns"]])
+    #same decision as `predict`, transformed and scored in parallel chunks
+    scores = isolation_forest_chunk_scores(
+        model["forest"], X, model["stats"]["median"], model["forest_center"], model["forest_scale"], categorical
+    )
+    return scores < model["forest"].offset_
+
+
+def _flag_result(df, flags, return_only_outliers):
+    df_result = df.copy(deep=False)
+    df_result["is_outlier"] = flags
+    return df_result[flags] if return_only_outliers else df_result
+
+
+def score_z_score_outliers(model, df, threshold=3.0, return_only_outliers=False):
+    """
+    Score a new batch with Z-scores against the fitted baseline mean/std.
+    """
+    df = entity_features(model, df)
+    flags = _z_score_flags(model, _project(model, df), threshold)
+    return _flag_result(df, flags, return_only_outliers)
+
+
+def score_iqr_outliers(model, df, k=1.5, return_only_outliers=False):
+    """
+    Score a new batch against the fitted baseline IQR fences.
+    """
+    df = entity_features(model, df)
+    flags = _iqr_flags(model, _project(model, df), k)
+    return _flag_result(df, flags, return_only_outliers)
+
+
+def score_isolation_forest_outliers(model, df, return_only_outliers=False):
+    """
+    Score a new batch with the fitted preprocessing and Isolation Forest.
+    """
+    df = entity_features(model, df)
+    flags = _isolation_forest_flags(model, _project(model, df), df)
+    return _flag_result(df, flags, return_only_outliers)
+
+
+def score_ensemble_outliers(model, df, voting="majority", threshold=3.0, k=1.5, return_only_outliers=False):
+    """
+    Score a new batch with all three fitted detectors and combine their votes
+    like `detect_ensemble_outliers`. Only a transform and a predict pass run.
+    """
+    df = entity_features(model, df)
+    X = _project(model, df)
+    return build_ensemble_result(
+        df,
+        _z_score_flags(model, X, threshold),
+        _iqr_flags(model, X, k),
+        _isolation_forest_flags(model, X, df),
+        voting=voting,
+        return_only_outliers=return_only_outliers,
+    )
+
+
+def save_detector_model(model, path):
+    """
+    Write a fitted model to the directory `path`.
+
+    Layout: `meta.json` (format version, columns, parameters), `stats.npy`
+    (one row per statistic in `STAT_NAMES`), `forest_scaling.npy`,
+    `forest.joblib` and, if fitted, `categorical.joblib` and
+    `entity_aggregator.joblib` (with its retained history). The arrays are
+    stored uncompressed so they can be memory-mapped on load.
+    """
+    os.makedirs(path, exist_ok=True)
+    meta = {
+        "version": model["version"],
+        "sklearn_version": sklearn.__version__,
+        "id_column": model["id_column"],
+        "columns": model["columns"],
+        "date_cols": model["date_cols"],
+        "date_formats": model["date_formats"],
+        "stat_names": STAT_NAMES,
+        "params": model["params"],
+        "has_forest": model["forest"] is not None,
+        "categorical_columns": model["categorical_columns"],
+        "has_entity_aggregator": model["entity_aggregator"] is not None,
+    }
+    stats = np.vstack([np.asarray(model["stats"][name], dtype=np.float64) for name in STAT_NAMES])
+    np.save(os.path.join(path, "stats.npy"), stats)
+    np.save(os.path.join(path, "forest_scaling.npy"), np.vstack([model["forest_center"], model["forest_scale"]]))
+    if model["forest"] is not None:
+        joblib.dump(model["forest"], os.path.join(path, "forest.joblib"))
+    if model["categorical_encoder"] is not None:
+        joblib.dump(model["categorical_encoder"], os.path.join(path, "categorical.joblib"))
+    if model["entity_aggregator"] is not None:
+        joblib.dump(model["entity_aggregator"], os.path.join(path, "entity_aggregator.joblib"))
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_detector_model(path, mmap_mode="r"):
+    """
+    Load a model written by `save_detector_model`.
+
+    Parameters:
+        path (str): Model directory.
+        mmap_mode (str): Passed to `np.load`/`joblib.load`; "r" memory-maps the
+            statistics and forest arrays instead of reading them into memory.
+            Use None to load everything eagerly.
+    """
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    if meta["version"] != MODEL_VERSION:
+        raise ValueError(
+            f"Unsupported model version {meta['version']} (expected {MODEL_VERSION}); refit the model."
+        )
+
+    stats = np.load(os.path.join(path, "stats.npy"), mmap_mode=mmap_mode)
+    scaling = np.load(os.path.join(path, "forest_scaling.npy"), mmap_mode=mmap_mode)
+    forest = None
+    if meta["has_forest"]:
+        forest = joblib.load(os.path.join(path, "forest.joblib"), mmap_mode=mmap_mode)
+    cat_cols = meta["categorical_columns"]
+    encoder = None
+    if cat_cols:
+        encoder = joblib.load(os.path.join(path, "categorical.joblib"))
+    aggregator = None
+    if meta["has_entity_aggregator"]:
+        aggregator = joblib.load(os.path.join(path, "entity_aggregator.joblib"))
+
+    model_stats = dict(zip(meta["stat_names"], stats))
+    model_stats["count"] = model_stats["count"].astype(np.int64)
+
+    return {
+        "version": meta["version"],
+        "id_column": meta["id_column"],
+        "columns": meta["columns"],
+        "date_cols": meta["date_cols"],
+        "date_formats": meta["date_formats"],
+        "stats": model_stats,
+        "forest_center": scaling[0],
+        "forest_scale": scaling[1],
+        "categorical_columns": cat_cols,
+        "categorical_encoder": encoder,
+        "entity_aggregator": aggregator,
+        "forest": forest,
+        "params": meta["params"],
+    }
@@ -0,0 +1,177 @@
+import bisect
+import math
+import numbers
+from collections import OrderedDict, deque
+
+import numpy as np
+import pandas as pd
+
+
+def _to_seconds(value):
+    #numbers (python or numpy) are epoch seconds; everything else goes through
+    #pd.Timestamp, which reads naive times as UTC
+    if isinstance(value, (numbers.Real, np.number)) and not isinstance(value, (bool, np.bool_)):
+        return float(value)
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.tz_localize("UTC")
+    return timestamp.timestamp()
+
+
+class _ColumnWindow:
+    """Running sums and a sorted copy of one column's values inside a window."""
+
+    def __init__(self):
+        self.shift = None
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.sorted_values = []
+
+    def add(self, value):
+        if self.shift is None:
+            self.shift = value
+        centered = value - self.shift
+        self.total += centered
+        self.total_sq += centered * centered
+        bisect.insort(self.sorted_values, value)
+
+    def remove(self, value):
+        centered = value - self.shift
+        self.total -= centered
+        self.total_sq -= centered * centered
+        del self.sorted_values[bisect.bisect_left(self.sorted_values, value)]
+
+    def mean_std(self):
+        n = len(self.sorted_values)
+        mean = self.total / n
+        variance = max(self.total_sq - n * mean * mean, 0.0) / (n - 1)
+        return mean + self.shift, math.sqrt(variance)
+
+    def quartiles(self):
+        values = self.sorted_values
+        last = len(values) - 1
+        result = []
+        for q in (0.25, 0.75):
+            rank = q * last
+            low = int(rank)
+            high = min(low + 1, last)
+            result.append(values[low] + (values[high] - values[low]) * (rank - low))
+        return result
+
+
+class _KeyWindow:
+    def __init__(self, n_columns):
+        self.events = deque()
+        self.columns = [_ColumnWindow() for _ in range(n_columns)]
+
+    def evict(self, cutoff, max_events):
+        while self.events and (self.events[0][0] <= cutoff or len(self.events) > max_events):
+            _, values = self.events.popleft()
+            for window, value in zip(self.columns, values):
+                if value is not None:
+                    window.remove(value)
+
+    def add(self, timestamp, values):
+        self.events.append((timestamp, values))
+        for window, value in zip(self.columns, values):
+            if value is not None:
+                window.add(value)
+
+
+class RollingWindowDetector:
+    """
+    Incremental Z-score / IQR scoring over time-based rolling windows.
+
+    Each event is scored against the events of the same key (e.g. `user_id`)
+    seen in the preceding `window` of time, then added to that window. Window
+    state is running sums for the Z-score and a sorted value list for the
+    quartiles, so each update costs O(1) amortized for the Z-score and
+    O(w) for keeping the quartile list sorted (a binary search plus a list
+    insert or delete, a fast memmove in practice), with w capped at
+    `max_events_per_key`. Idle keys beyond `max_keys` are dropped
+    least-recently-used first, which bounds total memory.
+
+    Parameters:
+        value_columns (list): Numeric fields to score, e.g. ["failed_attempts"].
+        time_column (str): Timestamp field; epoch seconds, ISO strings or datetimes
+            (naive times are read as UTC).
+        key_column (str): Field that keys the windows. If None, one global window.
+        window (str or timedelta): Window length, e.g. "1h" or "7D".
+        threshold (float): Z-score threshold (default=3.0).
+        k (float): Multiplier for IQR (default=1.5).
+        min_events (int): Events a window needs before it can flag anything.
+        max_events_per_key (int): Hard cap on events kept per key.
+        max_keys (int): Number of keys kept in memory.
+    """
+
+    def __init__(
+        self, value_columns, time_column="timestamp", key_column=None, window="1h", threshold=3.0, k=1.5,
+        min_events=10, max_events_per_key=1024, max_keys=100_000
+    ):
+        self.value_columns = list(value_columns)
+        self.time_column = time_column
+        self.key_column = key_column
+        self.window_seconds = pd.Timedelta(window).total_seconds()
+        self.threshold = threshold
+        self.k = k
+        self.min_events = max(min_events, 2)
+        self.max_events_per_key = max_events_per_key
+        self.max_keys = max_keys
+        self._windows = OrderedDict()
+
+    def _window_for(self, key):
+        window = self._windows.get(key)
+        if window is None:
+            window = _KeyWindow(len(self.value_columns))
+            self._windows[key] = window
+            if len(self._windows) > self.max_keys:
+                self._windows.popitem(last=False)
+        else:
+            self._windows.move_to_end(key)
+        return window
+
+    def update(self, event):
+        """
+        Score one event (a mapping of field -> value) and add it to its window.
+
+        Returns:
+            dict: `zscore_<col>` and `iqr_flag_<col>` per value column, plus
+            `zscore_flag`, `iqr_flag`, `is_outlier` (either flag) and
+            `window_events` (history size the event was scored against).
+        """
+        key = event[self.key_column] if self.key_column is not None else None
+        timestamp = _to_seconds(event[self.time_column])
+        values = []
+        for col in self.value_columns:
+            value = event.get(col)
+            values.append(None if value is None or value != value else float(value))
+
+        window = self._window_for(key)
+        window.evict(timestamp - self.window_seconds, self.max_events_per_key - 1)
+
+        result = {"zscore_flag": False, "iqr_flag": False, "window_events": len(window.events)}
+        for col, column_window, value in zip(self.value_columns, window.columns, values):
+            z_score, iqr_flag = None, False
+            if value is not None and len(column_window.sorted_values) >= self.min_events:
+                mean, std = column_window.mean_std()
+                if std > 0:
+                    z_score = (value - mean) / std
+                    result["zscore_flag"] |= abs(z_score) > self.threshold
+                q1, q3 = column_window.quartiles()
+                iqr = q3 - q1
+                iqr_flag = value < q1 - self.k * iqr or value > q3 + self.k * iqr
+                result["iqr_flag"] |= iqr_flag
+            result[f"zscore_{col}"] = z_score
+            result[f"iqr_flag_{col}"] = iqr_flag
+        result["is_outlier"] = result["zscore_flag"] or result["iqr_flag"]
+
+        window.add(timestamp, values)
+        return result
+
+    def score_events(self, df):
+        """
+        Feed the rows of a DataFrame through `update` in order and return the
+        per-event results aligned with `df.index`. Useful for replaying logs.
+        """
+        records = df.to_dict("records")
+        return pd.DataFrame([self.update(record) for record in records], index=df.index)
@@ -0,0 +1,172 @@
+import contextvars
+import functools
+import json
+import logging
+import os
+import time
+
+import pandas as pd
+
+STAGES = ("parse", "type_inference", "preprocess", "fit", "score", "vote", "export")
+
+#the profiler collecting stages in the current context; None means instrumentation is off
+_ACTIVE = contextvars.ContextVar("detection_profiler", default=None)
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / (1024 * 1024) if hasattr(os, "sysconf") else None
+
+logger = logging.getLogger("detection.profiling")
+
+
+def _rss_mb():
+    #resident set size from /proc (Linux); None where unavailable
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, TypeError, ValueError, IndexError):
+        return None
+
+
+class _NullStage:
+    #shared no-op stand-in returned while no profiler is active
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    def __init__(self, profiler, name, label, rows):
+        self.profiler = profiler
+        self.name = name
+        self.label = label
+        self.rows = rows
+
+    def __enter__(self):
+        self.rss_before = _rss_mb() if self.profiler.track_memory else None
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.started
+        rss_after = _rss_mb() if self.rss_before is not None else None
+        self.profiler._record({
+            "stage": self.name,
+            "label": self.label,
+            "seconds": seconds,
+            "rows": None if self.rows is None else int(self.rows),
+            "memory_delta_mb": None if rss_after is None else rss_after - self.rss_before,
+        })
+        return False
+
+
+class StageProfiler:
+    """
+    Collects wall time, rows processed and RSS change for each pipeline stage
+    run while it is active.
+
+    Use it as a context manager; instrumented code in the same thread (or
+    asyncio task) reports into it:
+
+        with StageProfiler(callback=print) as profiler:
+            detect_ensemble_outliers(df, id_column="expense_id")
+        profiler.summary()
+
+    Parameters:
+        callback (callable): Called with each finished stage record (a dict
+            with `stage`, `label`, `seconds`, `rows`, `memory_delta_mb`).
+        track_memory (bool): Read RSS before and after each stage.
+    """
+
+    def __init__(self, callback=None, track_memory=True):
+        self.callback = callback
+        self.track_memory = track_memory
+        self.records = []
+        self._tokens = []
+
+    def __enter__(self):
+        self._tokens.append(_ACTIVE.set(self))
+        return self
+
+    def __exit__(self, *exc):
+        _ACTIVE.reset(self._tokens.pop())
+        return False
+
+    def _record(self, record):
+        self.records.append(record)
+        if self.callback is not None:
+            self.callback(record)
+
+    def stage(self, name, label=None, rows=None):
+        return _Stage(self, name, label or name, rows)
+
+    def summary(self):
+        """
+        Totals per stage in pipeline order.
+
+        Returns:
+            pd.DataFrame: `stage`, `calls`, `seconds`, `rows` and
+            `memory_delta_mb`.
+        """
+        columns = ["stage", "calls", "seconds", "rows", "memory_delta_mb"]
+        if not self.records:
+            return pd.DataFrame(columns=columns)
+        records = pd.DataFrame(self.records)
+        summary = records.groupby("stage", sort=False).agg(
+            calls=("seconds", "size"),
+            seconds=("seconds", "sum"),
+            rows=("rows", "max"),
+            memory_delta_mb=("memory_delta_mb", "sum"),
+        ).reset_index()
+        order = {name: i for i, name in enumerate(STAGES)}
+        rank = summary["stage"].map(lambda name: order.get(name, len(order)))
+        summary = summary.iloc[rank.argsort(kind="stable")]
+        return summary[columns].reset_index(drop=True)
+
+
+def stage(name, label=None, rows=None):
+    """
+    Context manager timing one stage into the active profiler. Returns a
+    shared no-op when profiling is off, so instrumentation costs one context
+    variable lookup. Set `.rows` on the returned object when the row count is
+    only known at the end.
+    """
+    profiler = _ACTIVE.get()
+    if profiler is None:
+        return _NULL_STAGE
+    return profiler.stage(name, label, rows)
+
+
+def profiled(name):
+    """
+    Decorator timing every call of a function as stage `name`, labelled with
+    the function name. Rows are taken from the first argument when it is a
+    DataFrame or array.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            profiler = _ACTIVE.get()
+            if profiler is None:
+                return func(*args, **kwargs)
+            rows = args[0].shape[0] if args and hasattr(args[0], "shape") else None
+            with profiler.stage(name, func.__name__, rows):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def log_stage(record, **context):
+    """
+    Profiler callback emitting each stage as one JSON log line, with any
+    `context` fields (e.g. dataset, detector) merged in.
+    """
+    logger.info(json.dumps({"event": "stage", **context, **record}, default=str))
@@ -0,0 +1,134 @@
+import contextvars
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from detection.features import build_numeric_matrix, categorical_columns, column_stats
+from detection.ml_based import (
+    DEFAULT_CATEGORICAL_ENCODING, SparseCategoricalEncoder, isolation_forest_matrix_flags, lof_matrix_flags
+)
+from detection.profiling import stage
+from detection.rule_based import z_score_matrix_flags, iqr_matrix_flags, mad_matrix_flags
+
+#name -> function(inputs, params) returning boolean flags by row position
+DETECTORS = {}
+
+DEFAULT_DETECTORS = ("zscore", "iqr", "iso")
+
+
+def register_detector(name):
+    """
+    Decorator adding a detector to the registry under `name`.
+
+    A detector is called as `func(inputs, params)`: `inputs` is the shared,
+    read-only dict from `detector_inputs` and `params` the ensemble's keyword
+    settings (threshold, k, contamination, random_state, ...). It returns a
+    boolean array by row position and must not modify `inputs`, since
+    detectors run concurrently on the same arrays. Its flags appear in
+    ensemble results as `<name>_flag`.
+    """
+    def decorator(func):
+        DETECTORS[name] = func
+        return func
+    return decorator
+
+
+@register_detector("zscore")
+def _zscore(inputs, params):
+    return z_score_matrix_flags(
+        inputs["X"], inputs["stats"], threshold=params.get("threshold", 3.0), columns=inputs["rule_columns"]
+    )
+
+
+@register_detector("iqr")
+def _iqr(inputs, params):
+    return iqr_matrix_flags(inputs["X"], inputs["stats"], k=params.get("k", 1.5), columns=inputs["rule_columns"])
+
+
+@register_detector("iso")
+def _isolation_forest(inputs, params):
+    return isolation_forest_matrix_flags(
+        inputs["X"], inputs["stats"], contamination=params.get("contamination", 0.05),
+        random_state=params.get("random_state", 42), categorical=inputs["categorical"],
+        sample_size=params.get("forest_sample_size"), n_jobs=params.get("n_jobs"),
+    )
+
+
+@register_detector("mad")
+def _median_absolute_deviation(inputs, params):
+    return mad_matrix_flags(
+        inputs["X"], inputs["stats"], threshold=params.get("mad_threshold", 3.5), columns=inputs["rule_columns"]
+    )
+
+
+@register_detector("lof")
+def _local_outlier_factor(inputs, params):
+    return lof_matrix_flags(
+        inputs["X"], inputs["stats"], contamination=params.get("contamination", 0.05),
+        n_neighbors=params.get("n_neighbors", 20),
+    )
+
+
+def detector_inputs(
+    df, id_column="id", exclude_columns=None, categorical_encoding=DEFAULT_CATEGORICAL_ENCODING, time_features=False
+):
+    """
+    Build the shared input every registered detector reads: the numeric
+    matrix `X` with its `columns` and `date_cols`, `rule_columns` (the
+    non-date positions the rule-based detectors score), per-column `stats`,
+    the encoded `categorical` features (None when `categorical_encoding`
+    is None or there are no categorical columns) and the source `df`.
+    """
+    exclude_columns = list(dict.fromkeys([id_column] + list(exclude_columns or [])))
+    X, columns, date_cols = build_numeric_matrix(df, exclude_columns=exclude_columns, time_features=time_features)
+    stats = column_stats(X)
+
+    categorical = None
+    if categorical_encoding is not None:
+        cat_cols = categorical_columns(df, exclude_columns=exclude_columns + date_cols)
+        if cat_cols:
+            with stage("preprocess", "categorical_encoding", rows=len(df)):
+                categorical = SparseCategoricalEncoder(categorical_encoding).fit_transform(df[cat_cols])
+
+    return {
+        "df": df,
+        "X": X,
+        "columns": columns,
+        "date_cols": date_cols,
+        #rule-based detectors only look at numeric columns, not parsed dates
+        "rule_columns": [j for j, col in enumerate(columns) if col not in date_cols],
+        "stats": stats,
+        "categorical": categorical,
+    }
+
+
+def run_detectors(inputs, detectors=DEFAULT_DETECTORS, max_workers=None, **params):
+    """
+    Run registered detectors over shared inputs, concurrently in a thread
+    pool (numpy and the forest release the GIL), so wall time approaches the
+    slowest detector rather than the sum.
+
+    Parameters:
+        inputs (dict): Output of `detector_inputs`.
+        detectors (list): Registered detector names.
+        max_workers (int): Pool size (default: one thread per detector, at
+            most one per CPU).
+        **params: Detector settings, e.g. threshold, k, contamination.
+
+    Returns:
+        dict: Detector name -> boolean flags, in `detectors` order.
+    """
+    if not detectors:
+        raise ValueError(f"No detectors to run; choose at least one of: {', '.join(DETECTORS)}.")
+    unknown = [name for name in detectors if name not in DETECTORS]
+    if unknown:
+        raise ValueError(f"Unknown detectors {unknown}; registered: {', '.join(DETECTORS)}.")
+    workers = min(max_workers or os.cpu_count() or 1, len(detectors))
+    if workers <= 1:
+        return {name: DETECTORS[name](inputs, params) for name in detectors}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        #copy the context so stage timings still reach an active profiler
+        futures = {
+            name: pool.submit(contextvars.copy_context().run, DETECTORS[name], inputs, params)
+            for name in detectors
+        }
+        return {name: future.result() for name, future in futures.items()}
@@ -1,7 +1,69 @@
 import pandas as pd
 import numpy as np
+from detection.profiling import profiled
 
-def detect_z_score_outliers(df, threshold=3.0, return_only_outliers=False, include_columns=None, exclude_columns=None):
+_STAT_FUNCS = {
+    "mean": lambda data: data.mean(),
+    "std": lambda data: data.std(),
+    "q1": lambda data: data.quantile(0.25),
+    "q3": lambda data: data.quantile(0.75),
+}
+
+
+def group_baselines(df, numeric_cols, group_by, stat_names, min_group_size=30):
+    """
+    Compute per-group statistics in one vectorized groupby pass.
+
+    Rows are mapped to integer group codes once; each statistic is a single
+    cythonized groupby aggregation over all columns. Groups with fewer than
+    `min_group_size` non-null values in a column fall back to the global
+    statistic for that column.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        numeric_cols (list): Columns to aggregate.
+        group_by (list): Columns that define the peer groups.
+        stat_names (list): Any of "mean", "std", "q1", "q3".
+        min_group_size (int): Minimum group size to trust group statistics.
+
+    Returns:
+        tuple: (codes, stats) where `codes` is the group code of every row and
+        `stats[name]` is an (n_groups, len(numeric_cols)) array, so
+        `stats[name][codes, j]` broadcasts column j's statistic back to rows.
+    """
+    codes = df.groupby(group_by, sort=False, dropna=False, observed=True).ngroup().to_numpy()
+    data = df[numeric_cols]
+    grouped = data.groupby(codes, sort=True)
+    small = grouped.count().to_numpy() < min_group_size
+
+    stats = {}
+    for name in stat_names:
+        group_values = _STAT_FUNCS[name](grouped)[numeric_cols].to_numpy(dtype=np.float64)
+        global_values = _STAT_FUNCS[name](data).to_numpy(dtype=np.float64)
+        stats[name] = np.where(small, global_values, group_values)
+    return codes, stats
+
+
+def _select_numeric_columns(df, include_columns, exclude_columns, group_by):
+    if include_columns is not None:
+        numeric_cols = [col for col in include_columns if pd.api.types.is_numeric_dtype(df[col])]
+    else:
+        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+
+    if exclude_columns is not None:
+        numeric_cols = [col for col in numeric_cols if col not in exclude_columns]
+
+    if group_by is not None:
+        numeric_cols = [col for col in numeric_cols if col not in group_by]
+
+    return numeric_cols
+
+
+@profiled("score")
+def detect_z_score_outliers(
+    df, threshold=3.0, return_only_outliers=False, include_columns=None, exclude_columns=None,
+    group_by=None, min_group_size=30
+):
     """
     Detect outliers in numeric columns using Z-score.
 
@@ -11,6 +73,9 @@ def detect_z_score_outliers(df, threshold=3.0, return_only_outliers=False, inclu
         return_only_outliers (bool): If True, return only the outlier rows.
         include_columns (list): Columns to include in detection. If None, use all numeric columns.
         exclude_columns (list): Columns to exclude from detection.
+        group_by (list): Score each row against its peer group (e.g.
+            ["department", "category"]) instead of the whole column.
+        min_group_size (int): Groups smaller than this use the global mean/std.
 
     Returns:
         pd.DataFrame: DataFrame with `is_outlier` and `zscore_*` columns.
@@ -18,13 +83,18 @@ def detect_z_score_outliers(df, threshold=3.0, return_only_outliers=False, inclu
     df = df.copy()
     df["is_outlier"] = False
 
-    if include_columns is not None:
-        numeric_cols = [col for col in include_columns if pd.api.types.is_numeric_dtype(df[col])]
-    else:
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    numeric_cols = _select_numeric_columns(df, include_columns, exclude_columns, group_by)
 
-    if exclude_columns is not None:
-        numeric_cols = [col for col in numeric_cols if col not in exclude_columns]
+    if group_by is not None:
+        codes, stats = group_baselines(df, numeric_cols, group_by, ["mean", "std"], min_group_size)
+        for j, col in enumerate(numeric_cols):
+            mean = stats["mean"][codes, j]
+            std = stats["std"][codes, j]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z_scores = np.where(std > 0, (df[col].to_numpy(dtype=np.float64, na_value=np.nan) - mean) / std, 0.0)
+            df[f"zscore_{col}"] = z_scores
+            df["is_outlier"] |= np.abs(z_scores) > threshold
+        return df[df["is_outlier"]] if return_only_outliers else df
 
     for col in numeric_cols:
         mean = df[col].mean()
@@ -39,7 +109,11 @@ def detect_z_score_outliers(df, threshold=3.0, return_only_outliers=False, inclu
     return df[df["is_outlier"]] if return_only_outliers else df
 
 
-def detect_iqr_outliers(df, k=1.5, return_only_outliers=False, include_columns=None, exclude_columns=None):
+@profiled("score")
+def detect_iqr_outliers(
+    df, k=1.5, return_only_outliers=False, include_columns=None, exclude_columns=None,
+    group_by=None, min_group_size=30
+):
     """
     Detect outliers using the IQR (Interquartile Range) method.
 
@@ -49,6 +123,9 @@ def detect_iqr_outliers(df, k=1.5, return_only_outliers=False, include_columns=N
         return_only_outliers (bool): If True, return only the outlier rows.
         include_columns (list): Columns to include in detection. If None, use all numeric columns.
         exclude_columns (list): Columns to exclude from detection.
+        group_by (list): Compute quartiles per peer group (e.g.
+            ["department", "category"]) instead of over the whole column.
+        min_group_size (int): Groups smaller than this use the global quartiles.
 
     Returns:
         pd.DataFrame: DataFrame with `is_outlier` and `iqr_flag_*` columns.
@@ -56,13 +133,19 @@ def detect_iqr_outliers(df, k=1.5, return_only_outliers=False, include_columns=N
     df = df.copy()
     df["is_outlier"] = False
 
-    if include_columns is not None:
-        numeric_cols = [col for col in include_columns if pd.api.types.is_numeric_dtype(df[col])]
-    else:
-        numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+    numeric_cols = _select_numeric_columns(df, include_columns, exclude_columns, group_by)
 
-    if exclude_columns is not None:
-        numeric_cols = [col for col in numeric_cols if col not in exclude_columns]
+    if group_by is not None:
+        codes, stats = group_baselines(df, numeric_cols, group_by, ["q1", "q3"], min_group_size)
+        for j, col in enumerate(numeric_cols):
+            q1 = stats["q1"][codes, j]
+            q3 = stats["q3"][codes, j]
+            iqr = q3 - q1
+            values = df[col].to_numpy(dtype=np.float64, na_value=np.nan)
+            flag_col = f"iqr_flag_{col}"
+            df[flag_col] = (values < q1 - k * iqr) | (values > q3 + k * iqr)
+            df["is_outlier"] |= df[flag_col]
+        return df[df["is_outlier"]] if return_only_outliers else df
 
     for col in numeric_cols:
         q1 = df[col].quantile(0.25)
@@ -75,3 +158,120 @@ def detect_iqr_outliers(df, k=1.5, return_only_outliers=False, include_columns=N
         df["is_outlier"] |= df[flag_col]
 
     return df[df["is_outlier"]] if return_only_outliers else df
+
+
+@profiled("score")
+def z_score_matrix_flags(X, stats, threshold=3.0, columns=None):
+    """
+    Vectorized Z-score flags over a numeric matrix with precomputed statistics.
+
+    Parameters:
+        X (np.ndarray): 2D float matrix, one column per feature.
+        stats (dict): Output of `detection.features.column_stats` for X.
+        threshold (float): Z-score threshold (default=3.0).
+        columns (list): Column positions to score. If None, score every column.
+
+    Returns:
+        np.ndarray: Boolean array, True where any column exceeds the threshold.
+    """
+    flags = np.zeros(len(X), dtype=bool)
+    for j in range(X.shape[1]) if columns is None else columns:
+        std = stats["std"][j]
+        if not np.isfinite(std) or std == 0:
+            continue
+        flags |= np.abs(X[:, j] - stats["mean"][j]) > threshold * std
+    return flags
+
+
+@profiled("score")
+def iqr_matrix_flags(X, stats, k=1.5, columns=None):
+    """
+    Vectorized IQR flags over a numeric matrix with precomputed quartiles.
+
+    Parameters:
+        X (np.ndarray): 2D float matrix, one column per feature.
+        stats (dict): Output of `detection.features.column_stats` for X.
+        k (float): Multiplier for IQR (default=1.5).
+        columns (list): Column positions to score. If None, score every column.
+
+    Returns:
+        np.ndarray: Boolean array, True where any column falls outside its fences.
+    """
+    flags = np.zeros(len(X), dtype=bool)
+    for j in range(X.shape[1]) if columns is None else columns:
+        q1, q3 = stats["q1"][j], stats["q3"][j]
+        iqr = q3 - q1
+        column = X[:, j]
+        flags |= (column < q1 - k * iqr) | (column > q3 + k * iqr)
+    return flags
+
+
+@profiled("score")
+def mad_matrix_flags(X, stats, threshold=3.5, columns=None):
+    """
+    Robust Z-score flags: the modified Z-score 0.6745 * (x - median) / MAD
+    (Iglewicz and Hoaglin) per column, so a few extreme values do not
+    inflate the spread they are judged against.
+
+    Parameters:
+        X (np.ndarray): 2D float matrix, one column per feature.
+        stats (dict): Output of `detection.features.column_stats` for X.
+        threshold (float): Modified Z-score threshold (default=3.5).
+        columns (list): Column positions to score. If None, score every column.
+
+    Returns:
+        np.ndarray: Boolean array, True where any column exceeds the threshold.
+    """
+    flags = np.zeros(len(X), dtype=bool)
+    for j in range(X.shape[1]) if columns is None else columns:
+        deviation = np.abs(X[:, j] - stats["median"][j])
+        if np.isnan(deviation).all():
+            continue
+        mad = np.nanmedian(deviation)
+        if not np.isfinite(mad) or mad == 0:
+            continue
+        flags |= 0.6745 * deviation > threshold * mad
+    return flags
+
+
+@profiled("score")
+def z_score_matrix_scores(X, stats, columns=None):
+    """
+    Continuous Z-score per row: the largest |z| across the scored columns.
+
+    `z_score_matrix_flags(..., threshold=t)` flags exactly the rows scoring
+    above t, so one call serves a whole threshold sweep. Rows with no
+    scorable value get -inf.
+    """
+    scores = np.full(len(X), -np.inf)
+    for j in range(X.shape[1]) if columns is None else columns:
+        std = stats["std"][j]
+        if not np.isfinite(std) or std == 0:
+            continue
+        z = np.abs(X[:, j] - stats["mean"][j]) / std
+        np.fmax(scores, z, out=scores)
+    return scores
+
+
+@profiled("score")
+def iqr_matrix_scores(X, stats, columns=None):
+    """
+    Continuous IQR score per row: the largest distance beyond the quartiles,
+    in units of IQR, across the scored columns.
+
+    A row scores above k exactly when `iqr_matrix_flags(..., k=k)` flags it.
+    Values outside a zero-width IQR score +inf; rows with no scorable value
+    get -inf.
+    """
+    scores = np.full(len(X), -np.inf)
+    for j in range(X.shape[1]) if columns is None else columns:
+        q1, q3 = stats["q1"][j], stats["q3"][j]
+        iqr = q3 - q1
+        column = X[:, j]
+        distance = np.fmax(q1 - column, column - q3)
+        if iqr > 0:
+            distance = distance / iqr
+        else:
+            distance = np.where(distance > 0, np.inf, -np.inf)
+        np.fmax(scores, distance, out=scores)
+    return scores
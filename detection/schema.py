@@ -0,0 +1,169 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+#derived per datetime column, named "<column>_<feature>"
+TIME_FEATURES = ("hour", "dayofweek")
+
+#schemas cached per column layout, least recently used evicted first
+SCHEMA_CACHE_ENTRIES = 64
+_SCHEMA_CACHE = OrderedDict()
+
+#leading rows hashed to tell frames with the same layout apart
+FINGERPRINT_ROWS = 1000
+
+
+def is_datetime_column(name):
+    lowered = str(name).lower()
+    return "time" in lowered or "date" in lowered
+
+
+def infer_datetime_format(values, guesses=5):
+    """
+    Find one strptime format that parses every non-null value in `values`.
+
+    Candidates are guessed from the first `guesses` values; returns None when
+    no single format fits (e.g. mixed layouts), so callers fall back to
+    pandas' own inference.
+    """
+    sample = pd.Series(values).dropna()
+    if sample.empty or not pd.api.types.is_string_dtype(sample):
+        return None
+    sample = sample.astype(str)
+    candidates = dict.fromkeys(guess_datetime_format(value) for value in sample.iloc[:guesses])
+    for fmt in candidates:
+        if fmt is None:
+            continue
+        if pd.to_datetime(sample, format=fmt, errors="coerce").notna().all():
+            return fmt
+    return None
+
+
+def parse_datetime(series, fmt=None):
+    """
+    Parse a column to datetimes, unparseable values as NaT.
+
+    With a known `fmt` parsing skips format guessing; if the format misses any
+    value the column is re-parsed without it, so the result never loses dates.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if fmt is not None:
+        parsed = pd.to_datetime(series, format=fmt, errors="coerce")
+        if parsed.isna().sum() == series.isna().sum():
+            return parsed
+    return pd.to_datetime(series, errors="coerce")
+
+
+def infer_schema(df, id_column=None, sample_rows=10_000):
+    """
+    Infer column roles from the first `sample_rows` rows.
+
+    Parameters:
+        df (pd.DataFrame): Input DataFrame.
+        id_column (str): Known ID column. If None, the first column named
+            "id" or ending in "id" is used, if any.
+        sample_rows (int): Rows inspected.
+
+    Returns:
+        dict: `id_column`, `numeric` and `categorical` column lists, and
+        `datetime`, mapping each date-like column that parses (by name, as in
+        `build_numeric_matrix`, or by dtype) to its strptime format, or None
+        when no single format fits or the column is already datetime.
+    """
+    sample = df.head(sample_rows)
+    if id_column is None:
+        id_like = [col for col in df.columns if str(col).lower().endswith("id")]
+        id_column = id_like[0] if id_like else None
+
+    numeric, categorical, datetime = [], [], {}
+    for col in df.columns:
+        values = sample[col]
+        if pd.api.types.is_bool_dtype(values):
+            continue
+        if pd.api.types.is_datetime64_any_dtype(values):
+            datetime[col] = None
+        elif pd.api.types.is_numeric_dtype(values):
+            if col != id_column:
+                numeric.append(col)
+        elif is_datetime_column(col) and parse_datetime(values).notna().any():
+            datetime[col] = infer_datetime_format(values)
+        elif col != id_column:
+            categorical.append(col)
+
+    return {"id_column": id_column, "numeric": numeric, "categorical": categorical, "datetime": datetime}
+
+
+def _content_fingerprint(df):
+    hashes = pd.util.hash_pandas_object(df.head(FINGERPRINT_ROWS), index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+def cached_schema(df, id_column=None, sample_rows=10_000):
+    """
+    `infer_schema`, computed once per frame and reused by every detector that
+    sees it. The key is the column layout (names and dtypes) plus a hash of
+    the first `FINGERPRINT_ROWS` rows, so another dataset with the same
+    layout never inherits date formats inferred from different values (an
+    ambiguous day/month format would otherwise parse silently wrong).
+    """
+    key = (
+        tuple(df.columns), tuple(str(dtype) for dtype in df.dtypes), id_column, len(df), _content_fingerprint(df)
+    )
+    schema = _SCHEMA_CACHE.get(key)
+    if schema is None:
+        schema = infer_schema(df, id_column=id_column, sample_rows=sample_rows)
+        _SCHEMA_CACHE[key] = schema
+        if len(_SCHEMA_CACHE) > SCHEMA_CACHE_ENTRIES:
+            _SCHEMA_CACHE.popitem(last=False)
+    else:
+        _SCHEMA_CACHE.move_to_end(key)
+    return schema
+
+
+def time_feature_values(seconds, feature):
+    """
+    Vectorized calendar feature from epoch seconds (float, NaN for missing):
+    "hour" of day 0-23 or "dayofweek" with Monday=0.
+    """
+    missing = np.isnan(seconds)
+    whole = np.where(missing, 0, seconds).astype(np.int64)
+    if feature == "hour":
+        values = (whole // 3600) % 24
+    elif feature == "dayofweek":
+        #1970-01-01 was a Thursday
+        values = (whole // 86400 + 3) % 7
+    else:
+        raise ValueError(f"Unknown time feature {feature!r}; use one of {', '.join(TIME_FEATURES)}.")
+    return np.where(missing, np.nan, values.astype(np.float64))
+
+
+def time_feature_source(name, date_cols):
+    """
+    The (datetime column, feature) a derived column name stands for, or None.
+    """
+    for col in date_cols:
+        for feature in TIME_FEATURES:
+            if name == f"{col}_{feature}":
+                return col, feature
+    return None
+
+
+def add_time_features(df, schema=None):
+    """
+    Return a shallow copy of `df` with `<column>_hour` and
+    `<column>_dayofweek` for every datetime column, so the DataFrame-based
+    detectors can score them like any other numeric column.
+    """
+    schema = schema or cached_schema(df)
+    result = df.copy(deep=False)
+    for col, fmt in schema["datetime"].items():
+        parsed = parse_datetime(df[col], fmt)
+        seconds = parsed.to_numpy(dtype="datetime64[s]").astype(np.int64).astype(np.float64)
+        seconds[parsed.isna().to_numpy()] = np.nan
+        for feature in TIME_FEATURES:
+            result[f"{col}_{feature}"] = time_feature_values(seconds, feature)
+    return result
@@ -0,0 +1,253 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from detection.model import entity_features, fit_detector_model, load_detector_model, score_ensemble_outliers
+from detection.schema import time_feature_source
+
+RESULT_COLUMNS = ["zscore_flag", "iqr_flag", "iso_flag", "vote_count", "is_outlier"]
+
+
+class MicroBatcher:
+    """
+    Groups concurrent scoring requests into one vectorized
+    `score_ensemble_outliers` call.
+
+    A background thread takes the first waiting request, then keeps collecting
+    until `max_batch_size` records are queued or `max_wait_ms` has passed, and
+    scores them as a single frame. A lone request therefore waits at most
+    `max_wait_ms` before it is scored. Batches are scored one at a time in
+    arrival order, which also advances the model's entity aggregator, if any,
+    exactly once per record.
+
+    Parameters:
+        model (dict): Fitted model from `fit_detector_model`/`load_detector_model`.
+        max_batch_size (int): Records scored per batch at most.
+        max_wait_ms (float): Latency budget for filling a batch.
+        voting (str): "majority" (2 of 3) or "consensus" (3 of 3).
+        threshold (float): Z-score threshold.
+        k (float): IQR multiplier.
+    """
+
+    def __init__(self, model, max_batch_size=256, max_wait_ms=5.0, voting="majority", threshold=3.0, k=1.5):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.params = {"voting": voting, "threshold": threshold, "k": k}
+        self.batches = 0
+        self.records = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, records):
+        """
+        Queue a list of record dicts. Returns a Future resolving to one
+        result dict per record, in order.
+        """
+        future = Future()
+        self._queue.put((records, future))
+        return future
+
+    def score(self, records, timeout=None):
+        return self.submit(records).result(timeout=timeout)
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self, first):
+        pending = [first]
+        size = len(first[0])
+        deadline = time.perf_counter() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            pending = self._collect(first)
+            records = [record for batch, _ in pending for record in batch]
+            frame = None
+            try:
+                #aggregates first: if this fails the aggregator is left untouched
+                frame = entity_features(self.model, pd.DataFrame.from_records(records))
+                result = score_ensemble_outliers(self.model, frame, **self.params)
+                rows = result[RESULT_COLUMNS].to_dict("records")
+            except Exception as exc:
+                #one bad record fails its batch; score the requests one by one so only it errors
+                if len(pending) > 1:
+                    prepared = frame if self.model["entity_aggregator"] is not None else None
+                    self._score_individually(pending, prepared)
+                else:
+                    pending[0][1].set_exception(exc)
+                continue
+            self.batches += 1
+            self.records += len(records)
+            start = 0
+            for batch, future in pending:
+                future.set_result([_plain(row) for row in rows[start:start + len(batch)]])
+                start += len(batch)
+
+    def _score_individually(self, pending, frame=None):
+        #`frame` holds the batch with entity aggregates already added; reuse its
+        #rows so the aggregator is not advanced twice
+        start = 0
+        for batch, future in pending:
+            if frame is not None:
+                records = frame.iloc[start:start + len(batch)].reset_index(drop=True)
+            else:
+                records = pd.DataFrame.from_records(batch)
+            start += len(batch)
+            try:
+                result = score_ensemble_outliers(self.model, records, **self.params)
+                future.set_result([_plain(row) for row in result[RESULT_COLUMNS].to_dict("records")])
+            except Exception as exc:
+                future.set_exception(exc)
+
+
+def _plain(row):
+    #numpy scalars -> JSON-friendly python values
+    return {key: value.item() if hasattr(value, "item") else value for key, value in row.items()}
+
+
+def _missing_columns(model, records):
+    #derived time features and entity aggregates are computed by the service, not sent
+    aggregator = model["entity_aggregator"]
+    derived = set(aggregator.feature_columns) if aggregator is not None else set()
+    required = [
+        col for col in model["columns"]
+        if time_feature_source(col, model["date_cols"]) is None and col not in derived
+    ]
+    required += model["categorical_columns"]
+    return sorted({col for record in records for col in required if col not in record})
+
+
+def make_handler(batcher, timeout=30.0):
+    """
+    Request handler class bound to `batcher`.
+
+    POST /score takes one record (JSON object) or a list of records and
+    returns `{"results": [...]}` with per-detector flags, `vote_count` and
+    `is_outlier` per record. GET /health reports batching counters.
+    """
+    class ScoringHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        #headers and body go out in separate writes; don't let Nagle hold the body back
+        disable_nagle_algorithm = True
+
+        def _send(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._send(404, {"error": "not found"})
+                return
+            self._send(200, {"status": "ok", "batches": batcher.batches, "records": batcher.records})
+
+        def do_POST(self):
+            if self.path != "/score":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            except (ValueError, json.JSONDecodeError):
+                self._send(400, {"error": "body must be a JSON record or list of records"})
+                return
+            records = payload if isinstance(payload, list) else [payload]
+            if not records or not all(isinstance(record, dict) for record in records):
+                self._send(400, {"error": "body must be a JSON record or list of records"})
+                return
+            missing = _missing_columns(batcher.model, records)
+            if missing:
+                self._send(400, {"error": f"records are missing columns: {', '.join(missing)}"})
+                return
+            try:
+                results = batcher.score(records, timeout=timeout)
+            except Exception as exc:
+                self._send(500, {"error": str(exc)})
+                return
+            self._send(200, {"results": results})
+
+        def log_message(self, format, *args):
+            pass
+
+    return ScoringHandler
+
+
+class ScoringServer(ThreadingHTTPServer):
+    daemon_threads = True
+    #room for bursts of concurrent clients before connections are refused
+    request_queue_size = 128
+
+
+def serve(model, host="127.0.0.1", port=8765, max_batch_size=256, max_wait_ms=5.0, **score_params):
+    """
+    Serve `model` over HTTP until interrupted.
+    """
+    batcher = MicroBatcher(model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, **score_params)
+    server = ScoringServer((host, port), make_handler(batcher))
+    print(f"🚀 Scoring service listening on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP scoring service with micro-batching.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--model", help="Model directory written by save_detector_model")
+    source.add_argument("--fit", help="CSV to fit the model on at startup")
+    parser.add_argument("--id-column", default="id", help="ID column when fitting with --fit")
+    parser.add_argument(
+        "--entity-windows", nargs="*", default=None,
+        help="With --fit, add per-entity aggregates over these windows, e.g. 1h 1D"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-size", type=int, default=256)
+    parser.add_argument("--max-wait-ms", type=float, default=5.0)
+    parser.add_argument("--voting", choices=["majority", "consensus"], default="majority")
+    parser.add_argument("--threshold", type=float, default=3.0)
+    parser.add_argument("--k", type=float, default=1.5)
+    args = parser.parse_args()
+
+    if args.model:
+        detector_model = load_detector_model(args.model)
+    else:
+        detector_model = fit_detector_model(
+            pd.read_csv(args.fit), id_column=args.id_column, entity_windows=args.entity_windows
+        )
+    serve(
+        detector_model, host=args.host, port=args.port, max_batch_size=args.max_batch_size,
+        max_wait_ms=args.max_wait_ms, voting=args.voting, threshold=args.threshold, k=args.k,
+    )
@@ -0,0 +1,306 @@
+import glob
+import hashlib
+import io
+import json
+import os
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from detection.aggregation import EntityAggregator, add_entity_features
+from detection.ensemble import build_ensemble_result
+from detection.features import project_columns
+from detection.model import (
+    entity_features, fit_detector_model, load_detector_model, save_detector_model, score_ensemble_outliers
+)
+from detection.profiling import stage
+from detection.streaming import RunningColumnStats
+
+#2: flags stored as one parquet part per scored batch; 3: running statistics at fit time
+SNAPSHOT_VERSION = 3
+
+#bytes hashed at each end of the processed prefix
+FINGERPRINT_BYTES = 1 << 20
+
+FLAG_COLUMNS = ["zscore_flag", "iqr_flag", "iso_flag"]
+
+
+def _size(source):
+    return os.path.getsize(source) if isinstance(source, (str, os.PathLike)) else len(source)
+
+
+def _read_range(source, start, end):
+    if not isinstance(source, (str, os.PathLike)):
+        return bytes(memoryview(source)[start:end])
+    with open(source, "rb") as f:
+        f.seek(start)
+        return f.read(end - start)
+
+
+def prefix_fingerprint(source, length):
+    """
+    Content fingerprint of the first `length` bytes of a file path or bytes:
+    SHA-256 over the length and the first and last `FINGERPRINT_BYTES` of the
+    prefix, so checking it costs the same however long the history grows.
+    Rewrites that keep the length and both ends of the prefix go unnoticed.
+    """
+    digest = hashlib.sha256(str(length).encode())
+    digest.update(_read_range(source, 0, min(length, FINGERPRINT_BYTES)))
+    digest.update(_read_range(source, max(length - FINGERPRINT_BYTES, 0), length))
+    return digest.hexdigest()
+
+
+def _flags_frame(result, id_column):
+    columns = [id_column] if id_column in result.columns else []
+    return result[columns + FLAG_COLUMNS].reset_index(drop=True)
+
+
+def baseline_drift(baseline, current):
+    """
+    Largest shift across columns from `baseline` to `current` statistics (both
+    in the `column_stats` format): of the mean in baseline standard
+    deviations, and of the median and the interquartile range in baseline
+    interquartile ranges. The spread is followed through the quartiles, so
+    a batch of extreme outliers, which inflates the standard deviation, does
+    not count as drift. Columns without a spread in the baseline only count
+    when their statistics moved at all.
+    """
+    iqr = baseline["q3"] - baseline["q1"]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        shifts = np.concatenate([
+            np.abs(current["mean"] - baseline["mean"]) / baseline["std"],
+            np.abs(current["median"] - baseline["median"]) / iqr,
+            np.abs(current["q3"] - current["q1"] - iqr) / iqr,
+        ])
+    shifts = shifts[~np.isnan(shifts)]
+    return float(shifts.max()) if len(shifts) else 0.0
+
+
+def _part_path(path, index):
+    return os.path.join(path, f"flags-{index:06d}.parquet")
+
+
+def _empty_flags(snapshot):
+    id_column = snapshot["model"]["id_column"]
+    columns = [id_column] if id_column in snapshot["header"] else []
+    return pd.DataFrame({col: pd.Series(dtype=object if col == id_column else bool) for col in columns + FLAG_COLUMNS})
+
+
+def _votes(flags, voting="majority", return_only_outliers=False):
+    return build_ensemble_result(
+        flags.drop(columns=FLAG_COLUMNS), *(flags[col].to_numpy() for col in FLAG_COLUMNS), voting=voting,
+        return_only_outliers=return_only_outliers,
+    )
+
+
+def build_snapshot(
+    source, id_column="id", exclude_columns=None, threshold=3.0, k=1.5, entity_windows=None, **fit_params
+):
+    """
+    Fit the detectors on a whole CSV and record the baseline snapshot that
+    `update_snapshot` extends as rows are appended.
+
+    Parameters:
+        source (str or bytes): CSV path or contents.
+        id_column (str): ID column, always excluded from scoring.
+        exclude_columns (list): Extra columns to exclude from scoring.
+        threshold (float): Z-score threshold.
+        k (float): IQR multiplier.
+        entity_windows (list): Window lengths for per-entity aggregates; the
+            aggregator is kept in the model and continued by each update.
+        **fit_params: Passed to `fit_detector_model` (contamination, ...).
+
+    Returns:
+        tuple: (snapshot, result) where `result` is the ensemble result of
+        every row.
+    """
+    with stage("parse", "snapshot_build"):
+        #read through EOF: a final line without its newline is a complete row
+        data = _read_range(source, 0, _size(source))
+        df = pd.read_csv(io.BytesIO(data))
+
+    aggregator = None
+    if entity_windows:
+        #aggregate once: the model's scoring reuses these columns instead of advancing the aggregator again
+        aggregator = EntityAggregator(windows=entity_windows, id_column=id_column)
+        df = add_entity_features(df, aggregator=aggregator)
+    model = fit_detector_model(
+        df, id_column=id_column, exclude_columns=exclude_columns, entity_aggregator=aggregator, **fit_params
+    )
+    running = RunningColumnStats(len(model["columns"]))
+    running.update(project_columns(df, model["columns"], model["date_cols"], date_formats=model["date_formats"]))
+    result = score_ensemble_outliers(model, df, threshold=threshold, k=k)
+
+    snapshot = {
+        "version": SNAPSHOT_VERSION,
+        "header": df.columns.tolist(),
+        "offset": len(data),
+        "rows": len(df),
+        "fit_rows": len(df),
+        "fingerprint": prefix_fingerprint(source, len(data)),
+        "ends_with_newline": data.endswith(b"\n"),
+        "score_params": {"threshold": threshold, "k": k},
+        #mergeable moments and sketches of every row, and their state when the model was fitted
+        "running": running,
+        "baseline": running.to_stats(),
+        "model": model,
+        #flag frames not yet written, and the parts already saved in `path`
+        "flags": [_flags_frame(result, id_column)],
+        "parts": 0,
+        "path": None,
+    }
+    return snapshot, result
+
+
+def update_snapshot(snapshot, source, rebuild_growth=2.0, rebuild_drift=0.25, **build_params):
+    """
+    Score only the rows appended to `source` since `snapshot` was taken.
+
+    The appended bytes are read from the recorded offset through EOF and
+    their moments and quantile sketches are merged into the snapshot's
+    running statistics. While those stay within `rebuild_drift` of their
+    state at fit time (see `baseline_drift`), the rows are scored by the
+    Z-score, IQR and Isolation Forest detectors of the snapshot's fitted
+    model, whose exact statistics are never replaced by the approximate
+    running ones. Earlier rows keep the flags they were given. The snapshot
+    is rebuilt from the whole file when there is none, its prefix no longer
+    matches (the file was rewritten or truncated), the last row it read had
+    no newline and the appended bytes continue it, the data has grown
+    `rebuild_growth` times since the forest was fitted or the merged
+    statistics have drifted.
+
+    Parameters:
+        snapshot (dict): From `build_snapshot`/`load_snapshot`, or None.
+        source (str or bytes): CSV path or contents, the snapshot's prefix
+            followed by the appended rows.
+        rebuild_growth (float): Refit once rows reach this multiple of the
+            rows the forest was fitted on. None never refits.
+        rebuild_drift (float): Refit once `baseline_drift` of the merged
+            statistics exceeds this. None never refits.
+        **build_params: Passed to `build_snapshot` when rebuilding.
+
+    Returns:
+        tuple: (snapshot, result) where `result` is the ensemble result of the
+        appended rows only (every row after a rebuild).
+    """
+    size = _size(source)
+    if (
+        snapshot is None
+        or snapshot["version"] != SNAPSHOT_VERSION
+        or size < snapshot["offset"]
+        or prefix_fingerprint(source, snapshot["offset"]) != snapshot["fingerprint"]
+    ):
+        return build_snapshot(source, **build_params)
+
+    with stage("parse", "snapshot_delta"):
+        data = _read_range(source, snapshot["offset"], size)
+        if not data:
+            return snapshot, _votes(_empty_flags(snapshot))
+        if not snapshot["ends_with_newline"] and not data.startswith((b"\n", b"\r\n")):
+            #the last row read at EOF was still being written and has grown since
+            return build_snapshot(source, **build_params)
+        delta = pd.read_csv(io.BytesIO(data), header=None, names=snapshot["header"])
+    if rebuild_growth is not None and snapshot["rows"] + len(delta) >= rebuild_growth * snapshot["fit_rows"]:
+        return build_snapshot(source, **build_params)
+
+    model = snapshot["model"]
+    #entity aggregates continue from the history the model's aggregator retained
+    delta = entity_features(model, delta)
+    running = snapshot["running"]
+    running.update(project_columns(delta, model["columns"], model["date_cols"], date_formats=model["date_formats"]))
+    if rebuild_drift is not None and baseline_drift(snapshot["baseline"], running.to_stats()) > rebuild_drift:
+        return build_snapshot(source, **build_params)
+    result = score_ensemble_outliers(model, delta, **snapshot["score_params"])
+
+    snapshot["offset"] += len(data)
+    snapshot["rows"] += len(delta)
+    snapshot["fingerprint"] = prefix_fingerprint(source, snapshot["offset"])
+    snapshot["ends_with_newline"] = data.endswith(b"\n")
+    snapshot["flags"].append(_flags_frame(result, model["id_column"]))
+    return snapshot, result
+
+
+def snapshot_flags(snapshot):
+    """
+    ID and per-detector flags of every row the snapshot has scored, read
+    from its saved parts followed by the batches scored since.
+    """
+    frames = [pd.read_parquet(_part_path(snapshot["path"], i)) for i in range(snapshot["parts"])]
+    frames += snapshot["flags"]
+    return pd.concat(frames, ignore_index=True) if frames else _empty_flags(snapshot)
+
+
+def snapshot_result(snapshot, voting="majority", return_only_outliers=False):
+    """
+    Ensemble votes for every row the snapshot has scored, with its ID and
+    per-detector flags, without reading the data again.
+    """
+    return _votes(snapshot_flags(snapshot), voting=voting, return_only_outliers=return_only_outliers)
+
+
+def save_snapshot(snapshot, path):
+    """
+    Write a snapshot to the directory `path`: `snapshot.json` (offset, rows,
+    fingerprint, header), `running.joblib` (moments and sketches, and their
+    statistics at fit time), the
+    detector model in `model/` and one `flags-<n>.parquet` part per batch
+    scored since the last save. Parts already in `path` are not rewritten,
+    so a save costs the new batches only; a rebuilt snapshot replaces them.
+    """
+    os.makedirs(path, exist_ok=True)
+    if snapshot["path"] is None or os.path.abspath(snapshot["path"]) != os.path.abspath(path):
+        #rebuilt or saved elsewhere: the parts in `path` belong to another history
+        if snapshot["parts"]:
+            snapshot["flags"] = [snapshot_flags(snapshot)]
+            snapshot["parts"] = 0
+        for stale in glob.glob(os.path.join(path, "flags*.parquet")):
+            os.remove(stale)
+    for flags in snapshot["flags"]:
+        flags.to_parquet(_part_path(path, snapshot["parts"]), index=False)
+        snapshot["parts"] += 1
+    snapshot["flags"], snapshot["path"] = [], path
+
+    meta = {
+        key: snapshot[key]
+        for key in ("version", "header", "offset", "rows", "fit_rows", "fingerprint", "ends_with_newline", "parts")
+    }
+    meta["score_params"] = snapshot["score_params"]
+    save_detector_model(snapshot["model"], os.path.join(path, "model"))
+    joblib.dump(
+        {"running": snapshot["running"], "baseline": snapshot["baseline"]}, os.path.join(path, "running.joblib")
+    )
+    with open(os.path.join(path, "snapshot.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot written by `save_snapshot`; None if there is none or it
+    was written by an older version. Flag parts stay on disk until
+    `snapshot_flags` reads them.
+    """
+    meta_path = os.path.join(path, "snapshot.json")
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        snapshot = json.load(f)
+    if snapshot["version"] != SNAPSHOT_VERSION:
+        return None
+    snapshot["model"] = load_detector_model(os.path.join(path, "model"), mmap_mode=None)
+    snapshot.update(joblib.load(os.path.join(path, "running.joblib")))
+    snapshot["flags"], snapshot["path"] = [], path
+    return snapshot
+
+
+def incremental_detect(source, snapshot_dir, **build_params):
+    """
+    Load the snapshot in `snapshot_dir`, score the rows appended to the CSV
+    `source` since, and save the updated snapshot.
+
+    Returns:
+        tuple: (snapshot, result) as from `update_snapshot`.
+    """
+    snapshot, result = update_snapshot(load_snapshot(snapshot_dir), source, **build_params)
+    save_snapshot(snapshot, snapshot_dir)
+    return snapshot, result
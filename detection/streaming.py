@@ -0,0 +1,351 @@
+import argparse
+import math
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from detection.features import project_columns
+from detection.rule_based import z_score_matrix_flags, iqr_matrix_flags
+
+
+class QuantileSketch:
+    """
+    Mergeable quantile sketch with bounded relative error (DDSketch-style).
+
+    While a column has at most `max_exact_values` distinct values (IDs,
+    counts, categorical codes) they are counted exactly and quantiles match
+    pandas' linear interpolation. Beyond that, values are counted in
+    logarithmic buckets, so memory depends on the dynamic range of the data,
+    not on the number of rows, and estimates are within `relative_accuracy`
+    of a true value at that rank. Two sketches merge by adding counts.
+    """
+
+    def __init__(self, relative_accuracy=0.01, max_exact_values=4096):
+        self.relative_accuracy = relative_accuracy
+        self.max_exact_values = max_exact_values
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.exact = {}
+        self.positive = {}
+        self.negative = {}
+        self.zero_count = 0
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    @staticmethod
+    def _add_counts(store, keys, counts):
+        for key, count in zip(keys, counts):
+            store[key] = store.get(key, 0) + count
+
+    def _add_buckets(self, values, counts):
+        for store, mask, sign in ((self.positive, values > 0, 1), (self.negative, values < 0, -1)):
+            keys = np.ceil(np.log(sign * values[mask]) / self._log_gamma).astype(np.int64)
+            self._add_counts(store, keys.tolist(), counts[mask].tolist())
+        self.zero_count += int(counts[values == 0].sum())
+
+    def _collapse_exact(self):
+        values = np.fromiter(self.exact.keys(), dtype=np.float64, count=len(self.exact))
+        counts = np.fromiter(self.exact.values(), dtype=np.int64, count=len(self.exact))
+        self.exact = None
+        self._add_buckets(values, counts)
+
+    def add(self, values):
+        """Add an array of values; NaNs are ignored."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if values.size == 0:
+            return self
+        self.count += values.size
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+        values, counts = np.unique(values, return_counts=True)
+        if self.exact is not None and len(values) > self.max_exact_values:
+            self._collapse_exact()
+        if self.exact is not None:
+            self._add_counts(self.exact, values.tolist(), counts.tolist())
+            if len(self.exact) > self.max_exact_values:
+                self._collapse_exact()
+        else:
+            self._add_buckets(values, counts)
+        return self
+
+    def merge(self, other):
+        """Fold another sketch with the same accuracy into this one."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy.")
+        if self.exact is not None and other.exact is not None:
+            self._add_counts(self.exact, other.exact.keys(), other.exact.values())
+            if len(self.exact) > self.max_exact_values:
+                self._collapse_exact()
+        else:
+            if self.exact is not None:
+                self._collapse_exact()
+            if other.exact is not None:
+                values = np.fromiter(other.exact.keys(), dtype=np.float64, count=len(other.exact))
+                counts = np.fromiter(other.exact.values(), dtype=np.int64, count=len(other.exact))
+                self._add_buckets(values, counts)
+            for store, other_store in ((self.positive, other.positive), (self.negative, other.negative)):
+                self._add_counts(store, other_store.keys(), other_store.values())
+            self.zero_count += other.zero_count
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def _bucket_value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def _exact_quantile(self, rank):
+        values = np.array(sorted(self.exact))
+        ends = np.cumsum([self.exact[value] for value in values])
+        lower = values[np.searchsorted(ends, math.floor(rank), side="right")]
+        upper = values[np.searchsorted(ends, math.ceil(rank), side="right")]
+        return float(lower + (upper - lower) * (rank - math.floor(rank)))
+
+    def quantile(self, q):
+        """Estimate the q-th quantile (0 <= q <= 1); NaN for an empty sketch."""
+        if self.count == 0:
+            return np.nan
+        rank = q * (self.count - 1)
+        if self.exact is not None:
+            return self._exact_quantile(rank)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return max(-self._bucket_value(key), self.min)
+        seen += self.zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return min(self._bucket_value(key), self.max)
+        return self.max
+
+
+class RunningColumnStats:
+    """
+    Exact per-column count/mean/variance accumulated chunk by chunk with
+    Welford/Chan merging, plus one `QuantileSketch` per column for quartiles.
+    """
+
+    def __init__(self, n_columns, relative_accuracy=0.01):
+        self.count = np.zeros(n_columns, dtype=np.int64)
+        self.mean = np.zeros(n_columns)
+        self.m2 = np.zeros(n_columns)
+        self.sketches = [QuantileSketch(relative_accuracy) for _ in range(n_columns)]
+
+    def update(self, X):
+        """Merge the moments and sketches of a float matrix chunk."""
+        count = np.count_nonzero(~np.isnan(X), axis=0)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mean = np.nan_to_num(np.nanmean(X, axis=0))
+            m2 = np.nan_to_num(np.nanvar(X, axis=0)) * count
+
+        total = self.count + count
+        safe_total = np.maximum(total, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / safe_total
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / safe_total
+        self.count = total
+
+        for j, sketch in enumerate(self.sketches):
+            sketch.add(X[:, j])
+        return self
+
+    def merge(self, other):
+        """Fold the state of another accumulator over the same columns."""
+        total = self.count + other.count
+        safe_total = np.maximum(total, 1)
+        delta = other.mean - self.mean
+        self.mean = self.mean + delta * other.count / safe_total
+        self.m2 = self.m2 + other.m2 + delta ** 2 * self.count * other.count / safe_total
+        self.count = total
+        for sketch, other_sketch in zip(self.sketches, other.sketches):
+            sketch.merge(other_sketch)
+        return self
+
+    def to_stats(self):
+        """Return statistics in the `detection.features.column_stats` format."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            std = np.sqrt(self.m2 / (self.count - 1))
+        std[self.count < 2] = np.nan
+        mean = np.where(self.count > 0, self.mean, np.nan)
+        quartiles = np.array([[s.quantile(q) for s in self.sketches] for q in (0.25, 0.5, 0.75)])
+        return {
+            "count": self.count.copy(),
+            "mean": mean,
+            "std": std,
+            "q1": quartiles[0],
+            "median": quartiles[1],
+            "q3": quartiles[2],
+        }
+
+
+def _is_parquet(path):
+    return str(path).lower().endswith((".parquet", ".pq"))
+
+
+def _read_chunks(csv_path, chunksize, **read_csv_kwargs):
+    if _is_parquet(csv_path):
+        #parquet row batches read only the projected column chunks
+        import pyarrow.parquet as pq
+
+        columns = read_csv_kwargs.get("usecols")
+        batches = pq.ParquetFile(csv_path, memory_map=True).iter_batches(batch_size=chunksize, columns=columns)
+        return (batch.to_pandas() for batch in batches)
+    return pd.read_csv(csv_path, chunksize=chunksize, **read_csv_kwargs)
+
+
+def _stream_numeric_columns(csv_path, include_columns, exclude_columns, usecols=None, **read_csv_kwargs):
+    if _is_parquet(csv_path):
+        import pyarrow.parquet as pq
+
+        head = pq.read_schema(csv_path).empty_table().to_pandas()
+        if usecols is not None:
+            head = head[list(usecols)]
+    else:
+        head = pd.read_csv(csv_path, nrows=1000, usecols=usecols, **read_csv_kwargs)
+    if include_columns is not None:
+        columns = [col for col in include_columns if pd.api.types.is_numeric_dtype(head[col])]
+    else:
+        columns = head.select_dtypes(include=[np.number]).columns.tolist()
+    if exclude_columns is not None:
+        columns = [col for col in columns if col not in exclude_columns]
+    return columns
+
+
+def _check_numeric(chunk, columns, first_row):
+    #columns were chosen from the first rows; a later chunk can still turn out to hold text
+    for col in columns:
+        if not pd.api.types.is_numeric_dtype(chunk[col]) or pd.api.types.is_bool_dtype(chunk[col]):
+            raise ValueError(
+                f"Column {col!r} is not numeric in rows {first_row}-{first_row + len(chunk) - 1} "
+                f"(read as {chunk[col].dtype}); exclude it or pass an explicit dtype."
+            )
+
+
+def accumulate_column_stats(
+    csv_path, include_columns=None, exclude_columns=None, chunksize=100_000,
+    relative_accuracy=0.01, **read_csv_kwargs
+):
+    """
+    Pass one of streaming detection: accumulate baseline statistics for the
+    numeric columns of a CSV without loading it into memory.
+
+    Parameters:
+        csv_path (str): Input CSV or Parquet file.
+        include_columns (list): Columns to include. If None, use all numeric columns.
+        exclude_columns (list): Columns to exclude.
+        chunksize (int): Rows per chunk; peak memory is about one chunk.
+        relative_accuracy (float): Relative error of the quartile estimates.
+        **read_csv_kwargs: Passed to `pd.read_csv`; `usecols` limits the
+            columns considered for scoring.
+
+    Returns:
+        tuple: (columns, stats) where stats follows `column_stats`: exact
+        count/mean/std and sketched q1/median/q3.
+
+    Raises:
+        ValueError: If a selected column holds non-numeric values in a later chunk.
+    """
+    usecols = read_csv_kwargs.pop("usecols", None)
+    columns = _stream_numeric_columns(csv_path, include_columns, exclude_columns, usecols, **read_csv_kwargs)
+    running = RunningColumnStats(len(columns), relative_accuracy=relative_accuracy)
+    first_row = 0
+    for chunk in _read_chunks(csv_path, chunksize, usecols=columns, **read_csv_kwargs):
+        _check_numeric(chunk, columns, first_row)
+        running.update(project_columns(chunk, columns))
+        first_row += len(chunk)
+    return columns, running.to_stats()
+
+
+def stream_detect_outliers(
+    csv_path, sink, method="both", threshold=3.0, k=1.5, include_columns=None, exclude_columns=None,
+    chunksize=100_000, relative_accuracy=0.01, stats=None, **read_csv_kwargs
+):
+    """
+    Two-pass out-of-core Z-score / IQR detection over a CSV.
+
+    Pass one accumulates baseline statistics (skipped when `stats` is given as
+    the `(columns, stats)` output of `accumulate_column_stats`); pass two
+    scores chunk by chunk and hands flagged rows to `sink`.
+
+    Parameters:
+        csv_path (str): Input CSV or Parquet file.
+        sink (str or callable): Output CSV path, or a function called with each
+            DataFrame chunk of flagged rows.
+        method (str): "zscore", "iqr" or "both" (a row is flagged by either).
+        threshold (float): Z-score threshold (default=3.0).
+        k (float): Multiplier for IQR (default=1.5).
+        include_columns (list): Columns to include. If None, use all numeric columns.
+        exclude_columns (list): Columns to exclude.
+        chunksize (int): Rows per chunk; peak memory is about one chunk.
+        relative_accuracy (float): Relative error of the quartile estimates.
+        **read_csv_kwargs: Passed to `pd.read_csv`; `usecols` limits the
+            columns read and written to `sink`.
+
+    Returns:
+        dict: Row and outlier counts plus the statistics used for scoring.
+
+    Raises:
+        ValueError: If a scored column holds non-numeric values in a later chunk.
+    """
+    if method not in ("zscore", "iqr", "both"):
+        raise ValueError(f"Unknown method {method!r}; use 'zscore', 'iqr' or 'both'.")
+    if stats is None:
+        stats = accumulate_column_stats(
+            csv_path, include_columns, exclude_columns, chunksize, relative_accuracy, **read_csv_kwargs
+        )
+    columns, column_stats = stats
+
+    write_header = True
+    total_rows = 0
+    total_outliers = 0
+    for chunk in _read_chunks(csv_path, chunksize, **read_csv_kwargs):
+        _check_numeric(chunk, columns, total_rows)
+        X = project_columns(chunk, columns)
+        flags = np.zeros(len(chunk), dtype=bool)
+        if method in ("zscore", "both"):
+            zscore_flag = z_score_matrix_flags(X, column_stats, threshold=threshold)
+            chunk["zscore_flag"] = zscore_flag
+            flags |= zscore_flag
+        if method in ("iqr", "both"):
+            iqr_flag = iqr_matrix_flags(X, column_stats, k=k)
+            chunk["iqr_flag"] = iqr_flag
+            flags |= iqr_flag
+        chunk["is_outlier"] = flags
+
+        outliers = chunk[flags]
+        total_rows += len(chunk)
+        total_outliers += len(outliers)
+        if callable(sink):
+            sink(outliers)
+        elif len(outliers) or write_header:
+            outliers.to_csv(sink, mode="w" if write_header else "a", header=write_header, index=False)
+            write_header = False
+
+    return {"rows": total_rows, "outliers": total_outliers, "columns": columns, "stats": column_stats}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Out-of-core Z-score / IQR outlier detection for large CSVs.")
+    parser.add_argument("input", help="Input CSV or Parquet file")
+    parser.add_argument("output", help="CSV file that receives the flagged rows")
+    parser.add_argument("--method", choices=["zscore", "iqr", "both"], default="both")
+    parser.add_argument("--threshold", type=float, default=3.0)
+    parser.add_argument("--k", type=float, default=1.5)
+    parser.add_argument("--exclude", nargs="*", default=None, help="Columns to exclude, e.g. the ID column")
+    parser.add_argument("--chunksize", type=int, default=100_000)
+    args = parser.parse_args()
+
+    summary = stream_detect_outliers(
+        args.input, args.output, method=args.method, threshold=args.threshold, k=args.k,
+        exclude_columns=args.exclude, chunksize=args.chunksize,
+    )
+    print(f"Flagged {summary['outliers']} / {summary['rows']} rows -> {args.output}")
@@ -0,0 +1,70 @@
+import argparse
+import logging
+import os
+from contextlib import nullcontext
+
+import numpy as np
+import pandas as pd
+from detection.evaluation import detector_scores, evaluate_scores
+from detection.loader import load_dataset, detector_columns
+from detection.profiling import StageProfiler, log_stage
+from validate_detection import load_ground_truth
+
+#default sweeps: z-score threshold, IQR k; the forest sweeps its full score range
+DEFAULT_THRESHOLDS = {
+    "zscore": np.linspace(0.0, 10.0, 1000),
+    "iqr": np.linspace(0.0, 10.0, 1000),
+}
+
+
+def evaluate_dataset(file_path, ground_truth, n_thresholds=1000):
+    file_name = os.path.basename(file_path)
+    if file_name not in ground_truth:
+        print(f"❌ Skipping {file_name} — no ground truth.")
+        return None, None
+
+    id_column = ground_truth[file_name]["id_column"]
+    df = load_dataset(file_path, columns=detector_columns(file_path, id_column=id_column))
+    labels = df[id_column].isin(ground_truth[file_name]["injected_ids"]).to_numpy()
+
+    scores = detector_scores(df, id_column=id_column)
+    curves, summary = evaluate_scores(scores, labels, DEFAULT_THRESHOLDS, n_thresholds=n_thresholds)
+    curves.insert(0, "dataset", file_name)
+    summary.insert(0, "dataset", file_name)
+    return curves, summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Score each dataset once and sweep detector thresholds for precision/recall/F1 and PR-AUC."
+    )
+    parser.add_argument("--data-dir", default="data")
+    parser.add_argument("--thresholds", type=int, default=1000, help="Points in the forest's sweep")
+    parser.add_argument("--output", default=None, help="Optional CSV for the full curves")
+    parser.add_argument("--profile", action="store_true", help="Log per-stage timings as JSON lines")
+    args = parser.parse_args()
+    if args.profile:
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    ground_truth = load_ground_truth()
+    all_curves = []
+    for file in sorted(os.listdir(args.data_dir)):
+        if not file.endswith((".csv", ".parquet", ".feather", ".arrow")):
+            continue
+        profiler = StageProfiler(callback=lambda record: log_stage(record, dataset=file)) if args.profile else nullcontext()
+        with profiler:
+            curves, summary = evaluate_dataset(os.path.join(args.data_dir, file), ground_truth, args.thresholds)
+        if summary is None:
+            continue
+        all_curves.append(curves)
+        print(f"\n📂 {file}")
+        for row in summary.itertuples():
+            print(
+                f"  {row.detector:>6}: PR-AUC {row.pr_auc:.3f} | best F1 {row.best_f1:.3f} at "
+                f"threshold {row.best_threshold:.3f} (P {row.best_precision:.3f}, R {row.best_recall:.3f}, "
+                f"flags {row.best_flagged_fraction:.1%})"
+            )
+
+    if args.output and all_curves:
+        pd.concat(all_curves, ignore_index=True).to_csv(args.output, index=False)
+        print(f"\n📝 Curves written to {args.output}")
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_DIR = os.path.join(ROOT, "data")
+
+#the generator is a script directory, not a package
+sys.path.insert(0, os.path.join(ROOT, "data-generation"))
+
+#bundled datasets and the ID column each is scored with
+DATASETS = {
+    "corporate_card_logs.csv": "card_id",
+    "emburse_expense_report.csv": "expense_id",
+    "employee_expense_reports.csv": "employee_id",
+    "employee_productivity_logs.csv": "employee_id",
+    "login_audit_logs.csv": "user_id",
+}
+
+
+@pytest.fixture(params=sorted(DATASETS))
+def bundled_dataset(request):
+    """(path, id_column) of each bundled CSV."""
+    return os.path.join(DATA_DIR, request.param), DATASETS[request.param]
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from detection.ensemble import ensemble_flags
+from detection.ml_based import detect_robust_isolation_forest_outliers
+from detection.registry import detector_inputs, run_detectors
+from detection.rule_based import detect_iqr_outliers, detect_z_score_outliers
+from generate_large import SCHEMAS, build_frame
+
+
+def test_fused_flags_match_standalone_detectors(bundled_dataset):
+    path, id_column = bundled_dataset
+    df = pd.read_csv(path)
+    zscore_flag, iqr_flag, iso_flag = ensemble_flags(df, id_column=id_column)
+
+    z_scores = detect_z_score_outliers(df, exclude_columns=[id_column])
+    iqr = detect_iqr_outliers(df, exclude_columns=[id_column])
+    forest = detect_robust_isolation_forest_outliers(df, exclude_columns=[id_column])
+
+    np.testing.assert_array_equal(zscore_flag, z_scores["is_outlier"].to_numpy(dtype=bool))
+    np.testing.assert_array_equal(iqr_flag, iqr["is_outlier"].to_numpy(dtype=bool))
+    np.testing.assert_array_equal(iso_flag, forest["is_outlier"].to_numpy(dtype=bool))
+
+
+@pytest.fixture(scope="module", params=["corporate_card_logs", "emburse_expense_report"])
+def generated(request):
+    df, injected, _ = build_frame(request.param, 20_000, num_outliers=100)
+    return df, SCHEMAS[request.param][2], df[SCHEMAS[request.param][2]].isin(injected).to_numpy()
+
+
+def test_sampled_forest_covering_every_row_matches_in_memory(generated):
+    df, id_column, _ = generated
+    in_memory = detect_robust_isolation_forest_outliers(df, exclude_columns=[id_column])
+    sampled = detect_robust_isolation_forest_outliers(
+        df, exclude_columns=[id_column], sample_size=len(df), chunk_rows=3_000, n_jobs=2
+    )
+    np.testing.assert_array_equal(sampled["is_outlier"].to_numpy(), in_memory["is_outlier"].to_numpy())
+
+    inputs = detector_inputs(df, id_column=id_column)
+    np.testing.assert_array_equal(
+        run_detectors(inputs, ["iso"], forest_sample_size=len(df), n_jobs=2)["iso"],
+        run_detectors(inputs, ["iso"])["iso"],
+    )
+
+
+def test_sampled_forest_tracks_in_memory(generated):
+    df, id_column, injected = generated
+    inputs = detector_inputs(df, id_column=id_column)
+    in_memory = run_detectors(inputs, ["iso"])["iso"]
+    sampled = run_detectors(inputs, ["iso"], forest_sample_size=5_000, n_jobs=2)["iso"]
+    assert (sampled == in_memory).mean() >= 0.97
+    assert (sampled & injected).sum() >= (in_memory & injected).sum()
+
+    in_memory = detect_robust_isolation_forest_outliers(df, exclude_columns=[id_column])["is_outlier"].to_numpy()
+    sampled = detect_robust_isolation_forest_outliers(
+        df, exclude_columns=[id_column], sample_size=5_000, n_jobs=2
+    )["is_outlier"].to_numpy()
+    assert (sampled == in_memory).mean() >= 0.93
+    assert (sampled.astype(bool) & injected).sum() >= (in_memory.astype(bool) & injected).sum()
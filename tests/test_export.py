@@ -0,0 +1,73 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.testing.v1 import AppTest
+
+from conftest import DATA_DIR, ROOT
+from detection.ensemble import build_ensemble_result, ensemble_flags
+from detection.export import EXPORT_FORMATS
+from detection.loader import load_dataset
+
+FILE_NAME = "emburse_expense_report.csv"
+ID_COLUMN = "expense_id"
+
+READERS = {
+    "xlsx": lambda data: pd.read_excel(io.BytesIO(data), sheet_name="OutlierResults"),
+    "csv": lambda data: pd.read_csv(io.BytesIO(data)),
+    "parquet": lambda data: pd.read_parquet(io.BytesIO(data)),
+}
+
+
+class RecordingMediaFileManager(MediaFileManager):
+    #AppTest builds a media file manager per run and drops it afterwards; keep the latest
+    latest = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        RecordingMediaFileManager.latest = self
+
+
+def _widget(widgets, label):
+    return next(widget for widget in widgets if widget.label.startswith(label))
+
+
+@pytest.fixture(scope="module")
+def detected_app():
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setattr("streamlit.testing.v1.app_test.MediaFileManager", RecordingMediaFileManager)
+        yield _detect()
+
+
+def _detect():
+    with open(os.path.join(DATA_DIR, FILE_NAME), "rb") as f:
+        data = f.read()
+    app = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+    app.run()
+    app.file_uploader[0].upload(FILE_NAME, data, "text/csv")
+    app.run()
+    _widget(app.selectbox, "🆔").select(ID_COLUMN).run()
+    app.button[0].click().run()
+    assert not app.exception
+    return app, load_dataset(data, file_name=FILE_NAME)
+
+
+@pytest.mark.parametrize("fmt", EXPORT_FORMATS)
+def test_report_download_round_trip(detected_app, fmt):
+    app, df = detected_app
+    _widget(app.selectbox, "📄 Report format").select(fmt).run()
+    assert not app.exception
+
+    #serve the deferred download the way the browser's click does
+    button = app.get("download_button")[0]
+    media = RecordingMediaFileManager.latest
+    url = media.execute_deferred(button.proto.deferred_file_id)
+    report = READERS[fmt](media._storage.get_file(url.rsplit("/", 1)[-1]).content)
+
+    expected = build_ensemble_result(df, *ensemble_flags(df, id_column=ID_COLUMN))
+    assert report.columns.tolist() == expected.columns.tolist()
+    assert report[ID_COLUMN].tolist() == expected[ID_COLUMN].tolist()
+    for col in ["zscore_flag", "iqr_flag", "iso_flag", "vote_count", "is_outlier"]:
+        assert report[col].astype(int).tolist() == expected[col].astype(int).tolist()
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from detection.ensemble import detect_ensemble_outliers
+from detection.snapshot import incremental_detect, snapshot_result
+from generate_large import SCHEMAS, build_frame
+
+FLAG_COLUMNS = ["zscore_flag", "iqr_flag", "iso_flag", "is_outlier"]
+
+
+@pytest.fixture(params=sorted(SCHEMAS))
+def appended_csv(request, tmp_path):
+    #4000 normal rows, then 1000 more with 20 injected outliers appended
+    df, injected, _ = build_frame(request.param, 5_000, num_outliers=20)
+    path = tmp_path / "data.csv"
+    df.iloc[:4_000].to_csv(path, index=False)
+    return path, df, SCHEMAS[request.param][2], set(injected)
+
+
+def _append(path, rows):
+    rows.to_csv(path, index=False, header=False, mode="a")
+
+
+def test_rebuilt_snapshot_matches_full_refit(appended_csv, tmp_path):
+    path, df, id_column, _ = appended_csv
+    snapshot_dir = tmp_path / "snapshot"
+    incremental_detect(path, snapshot_dir, id_column=id_column)
+    _append(path, df.iloc[4_000:])
+    #growth past the fitted rows forces a refit on the whole file
+    snapshot, result = incremental_detect(path, snapshot_dir, id_column=id_column, rebuild_growth=1.1)
+
+    full = detect_ensemble_outliers(pd.read_csv(path), id_column=id_column)
+    assert snapshot["fit_rows"] == len(df) == len(result)
+    for col in FLAG_COLUMNS:
+        np.testing.assert_array_equal(snapshot_result(snapshot)[col].to_numpy(), full[col].to_numpy())
+
+
+def test_incremental_delta_tracks_full_refit(appended_csv, tmp_path):
+    path, df, id_column, injected = appended_csv
+    snapshot_dir = tmp_path / "snapshot"
+    incremental_detect(path, snapshot_dir, id_column=id_column)
+    _append(path, df.iloc[4_000:])
+    snapshot, delta = incremental_detect(path, snapshot_dir, id_column=id_column, rebuild_drift=None)
+
+    #only the appended rows were scored, against the baseline fitted on the first 4000
+    assert snapshot["fit_rows"] == 4_000 and len(delta) == len(df) - 4_000
+    assert sorted(f for f in os.listdir(snapshot_dir) if f.startswith("flags")) == [
+        "flags-000000.parquet", "flags-000001.parquet"
+    ]
+
+    full = detect_ensemble_outliers(pd.read_csv(path), id_column=id_column)
+    incremental = snapshot_result(snapshot)
+    assert len(incremental) == len(full)
+    assert (incremental["is_outlier"].to_numpy() == full["is_outlier"].to_numpy()).mean() >= 0.98
+    caught = set(incremental.loc[incremental["is_outlier"], id_column]) & injected
+    assert caught >= set(full.loc[full["is_outlier"], id_column]) & injected
+
+
+def test_final_line_without_newline(tmp_path):
+    df, _, _ = build_frame("corporate_card_logs", 600, num_outliers=0)
+    text = df.to_csv(index=False)
+    lines = text.splitlines(keepends=True)
+    path = tmp_path / "data.csv"
+    snapshot_dir = tmp_path / "snapshot"
+
+    #the last row is read at EOF even before its newline is written
+    path.write_text("".join(lines[:401]).rstrip("\n"))
+    snapshot, _ = incremental_detect(path, snapshot_dir, id_column="employee_id")
+    assert snapshot["rows"] == 400
+
+    #a newline and whole rows appended after it are scored as a delta
+    with open(path, "a") as f:
+        f.write("\n" + "".join(lines[401:501]))
+    snapshot, delta = incremental_detect(path, snapshot_dir, id_column="employee_id", rebuild_drift=None)
+    assert len(delta) == 100 and snapshot["fit_rows"] == 400
+
+    #a last row that was still being written when read forces a rebuild
+    partial = lines[501]
+    with open(path, "a") as f:
+        f.write(partial[:5])
+    snapshot, _ = incremental_detect(path, snapshot_dir, id_column="employee_id", rebuild_drift=None)
+    with open(path, "a") as f:
+        f.write(partial[5:])
+    snapshot, result = incremental_detect(path, snapshot_dir, id_column="employee_id", rebuild_drift=None)
+    assert len(result) == snapshot["rows"] == snapshot["fit_rows"] == 501
+    assert len(snapshot_result(snapshot)) == 501
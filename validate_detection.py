@@ -1,9 +1,11 @@
+import argparse
 import os
 import json
-import pandas as pd
 from detection.rule_based import detect_z_score_outliers, detect_iqr_outliers
 from detection.ml_based import detect_robust_isolation_forest_outliers
 from detection.ensemble import detect_ensemble_outliers
+from detection.loader import load_dataset, detector_columns
+from detection.snapshot import incremental_detect, snapshot_result
 
 GROUND_TRUTH_PATH = "data/_ground_truth_log.json"
 
@@ -17,9 +19,10 @@ def validate_dataset(file_path, ground_truth):
         print(f"❌ Skipping {file_name} — no ground truth.")
         return
 
-    df = pd.read_csv(file_path)
     true_outliers = set(ground_truth[file_name]["injected_ids"])
     id_column = ground_truth[file_name]["id_column"]
+    #read only the ID and the columns the detectors use
+    df = load_dataset(file_path, columns=detector_columns(file_path, id_column=id_column))
 
     print(f"\n📂 Validating: {file_name}")
 
@@ -37,9 +40,10 @@ def validate_dataset(file_path, ground_truth):
     iso_outliers = detect_robust_isolation_forest_outliers(
         df, 
         exclude_columns=[id_column], 
-        return_only_outliers=True
+        return_only_outliers=True,
+        id_column=id_column
     )
-    iso_ids = set(iso_outliers[id_column])
+    iso_ids = set(iso_outliers)
     report_detection("Isolation Forest", iso_ids, true_outliers)
 
     # ENSEMBLE
@@ -54,6 +58,23 @@ def validate_dataset(file_path, ground_truth):
     ensemble_ids = set(ensemble_outliers[id_column])
     report_detection("Ensemble", ensemble_ids, true_outliers)
 
+def validate_incremental(file_path, ground_truth, snapshot_dir):
+    file_name = os.path.basename(file_path)
+    if file_name not in ground_truth:
+        print(f"❌ Skipping {file_name} — no ground truth.")
+        return
+
+    true_outliers = set(ground_truth[file_name]["injected_ids"])
+    id_column = ground_truth[file_name]["id_column"]
+    #only rows appended since the last run are read and scored
+    snapshot, delta = incremental_detect(
+        file_path, os.path.join(snapshot_dir, file_name), id_column=id_column, exclude_columns=[id_column]
+    )
+
+    print(f"\n📂 Validating: {file_name} ({len(delta)} new of {snapshot['rows']} rows scored)")
+    ensemble_outliers = snapshot_result(snapshot, voting="majority", return_only_outliers=True)
+    report_detection("Ensemble", set(ensemble_outliers[id_column]), true_outliers)
+
 def report_detection(method_name, predicted_ids, true_ids):
     tp = len(predicted_ids & true_ids)
     total = len(true_ids)
@@ -62,9 +83,18 @@ def report_detection(method_name, predicted_ids, true_ids):
     print(f"     Detected IDs: {sorted(predicted_ids & true_ids)}")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check each detector against the injected outliers.")
+    parser.add_argument(
+        "--snapshot-dir", default=None,
+        help="Keep a baseline snapshot per CSV here and score only rows appended since the last run"
+    )
+    args = parser.parse_args()
+
     ground_truth = load_ground_truth()
     data_dir = "data"
 
     for file in os.listdir(data_dir):
-        if file.endswith(".csv"):
+        if args.snapshot_dir and file.endswith(".csv"):
+            validate_incremental(os.path.join(data_dir, file), ground_truth, args.snapshot_dir)
+        elif not args.snapshot_dir and file.endswith((".csv", ".parquet", ".feather", ".arrow")):
             validate_dataset(os.path.join(data_dir, file), ground_truth)